@@ -1,6 +1,6 @@
 import pandas as pd
 
-from data import data_io
+from data import data_profiling
 
 # Hacky script for quick manual analysis, hence no docs here
 pd.set_option("display.width", 1000)
@@ -8,51 +8,22 @@ pd.set_option("display.max_columns", None)
 pd.set_option("display.max_rows", 50)
 pd.set_option("display.max_colwidth", None)
 
-job_df = data_io.read_and_prepare_raw_data(drop_source=False)
-job_df = job_df.loc[:, ["job", "job_source", "label"]]
-
-
-def flatten_list(list_of_lists):
-    return [item for single_list in list_of_lists for item in single_list]
-
-
-def analyse_list_field(job_df, field_name):
-    print(f"Check {field_name}")
-    list_of_lists = job_df.apply(lambda row: row["job"].__getattribute__(field_name), 1)
-    print(f"Missing :{len([l for l in list_of_lists if not l])}")
-    values = flatten_list(list_of_lists)
-    print(pd.Series(values).sort_values().unique())
-
-
-def analyse_languages(job_df):
-    print("Check languages")
-    list_of_lists = job_df.apply(lambda row: list(row["job"].languages.keys()), 1)
-    languages = flatten_list(list_of_lists)
-    print(f"Jobs with missing languages :{len([l for l in list_of_lists if not l])}")
-    print(pd.Series(languages).sort_values().unique())
-    print("Check language ratings")
-    ratings = flatten_list(job_df.apply(lambda row: [language.rating for language in row["job"].languages.values()], 1))
-    print(pd.Series(ratings).sort_values().unique())
-
+profile = data_profiling.profile_data()["job"]
 
 # check properties
-analyse_list_field(job_df, "job_roles")
-analyse_languages(job_df)
-analyse_list_field(job_df, "seniorities")
-
-job_df["min_degree"] = job_df.apply(lambda row: row["job"].min_degree, 1)
-print(f"Min degree\n"
-      f"Missing:{pd.isna(job_df['min_degree']).sum()}\n"
-      f"Unique: {job_df['min_degree'].sort_values().unique()}")
-job_df["max_salary"] = job_df.apply(lambda row: row["job"].max_salary, 1)
-print(f"Max Salary"
-      f"Missing:{pd.isna(job_df['max_salary']).sum()}\n"
-      f"\n{job_df.max_salary.describe()}")
-
-job_df["none_seniority_allowed"] = job_df.apply(lambda x: None in x["job"].seniorities, 1)
-job_df["job_roles"] = job_df.apply(lambda row: row["job"].job_roles, 1)
-roles_sen_none = flatten_list(job_df.loc[job_df["none_seniority_allowed"]].apply(lambda row: row["job"].job_roles, 1))
-print(f"Job roles which allow seniority None: {pd.Series(roles_sen_none).sort_values().unique()}")
+print(f"Jobs: {profile['records']}")
+print(f"Missing\n{profile['missing']}")
+print(f"Check job_roles\n{profile['job_roles']}")
+print(f"Check languages\n{profile['languages']}")
+print(f"Check language ratings\n{profile['language_ratings']}")
+print(f"Must have languages\n{profile['must_have']}")
+print(f"Check seniorities\n{profile['seniorities']}")
+print(f"Min degree\n{profile['degrees']}")
+print(f"Max Salary\n{profile['salary']}")
+
+roles_sen_none = profile["seniority_roles"].loc["none"]
+print(f"Job roles which allow seniority None: {roles_sen_none[roles_sen_none > 0].index.values}")
+print(f"Seniorities per job role\n{profile['seniority_roles'].T}")
 
 # Seniority in case of jobs is solely used for jobs on individual contributor level.
 # Some titles include manager although being individual contributor (e.g. marketing manager)
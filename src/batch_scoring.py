@@ -0,0 +1,297 @@
+"""
+Provides a command line tool to score all combinations of a file of talents and a file of jobs with the trained
+model, e.g. for a nightly run of all candidates against all open jobs. Nothing is retrained.
+
+Usage (run from the src directory):
+
+    python -m batch_scoring path/to/talents.jsonl path/to/jobs.jsonl path/to/result.jsonl --top-k 10 --workers 8
+
+Talents and jobs are read from a JSON array or JSON lines, jobs may also be a job store (see features.job_store).
+Each talent and job may contain an 'id', else its position in the file is used. Invalid records are reported and
+skipped. Per talent, the results are ranked by the calibrated probability of being a match. The output is either
+
+* jsonl: one JSON object per combination, encoded by the workers and written while scoring
+* npy: a directory with one numpy file per field (columnar), preallocated and filled while scoring. The ids of
+  talents and jobs are stored in talent_ids.npy and job_ids.npy, indexed by talent_index and job_index
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from data.data_io import map_chunks
+from data.data_types import Job
+from data.data_types import Talent
+from data.data_validation import ValidationResult
+from data.data_validation import validate_jobs
+from data.data_validation import validate_talents
+from features.feature_extraction import cross_product_pairs
+from features.job_store import JobStore
+from features.job_store import read_json_records
+from models.model_service import Model
+from models.model_service import compact_result
+from models.model_service import compact_result_dtype
+from models.model_service import load_model
+
+TALENT_IDS_FILE_NAME = "talent_ids.npy"
+JOB_IDS_FILE_NAME = "job_ids.npy"
+
+# state of a worker process, set up once by _init_worker instead of being sent with every chunk
+_worker = {}
+
+
+def score_files(talents_path: str, jobs_path: str, output_path: str, output_format: str = "jsonl",
+                workers: int = 1, chunk_size: int = 64, top_k: int = None, progress: bool = True) -> int:
+    """
+    Scores all combinations of talents and jobs and writes the results, see module description.
+
+    :param talents_path: file with raw talents as JSON array or JSON lines
+    :param jobs_path: file with raw jobs as JSON array or JSON lines, or the directory of a job store
+    :param output_path: file (jsonl) or directory (npy) to write the results to, existing results are overwritten
+    :param output_format: either 'jsonl' or 'npy'
+    :param workers: number of processes scoring chunks in parallel, 1 scores in this process
+    :param chunk_size: number of talents per chunk, each chunk is scored against all jobs at once
+    :param top_k: number of best jobs to keep per talent, if None all combinations are kept
+    :param progress: if True, print progress and throughput after each chunk
+    :return: number of written results
+    :raises OSError: if something went wrong during reading or writing
+    :raises ValueError: if the output format is unknown or workers, chunk_size or top_k is not positive
+    """
+    if output_format not in ("jsonl", "npy"):
+        raise ValueError(f"Unknown output format {output_format}, expected 'jsonl' or 'npy'.")
+    if workers < 1 or chunk_size < 1 or (top_k is not None and top_k < 1):
+        raise ValueError("workers, chunk_size and top_k have to be positive.")
+    start_time = time.time()
+
+    # records are validated once here, workers get the normalized Talent and Job objects
+    talent_records = read_json_records(talents_path)
+    talents, talent_ids = _accepted_with_ids(talent_records, validate_talents(talent_records), "talent")
+    if os.path.isdir(jobs_path):
+        jobs = None
+        job_ids = JobStore.load(jobs_path).ids
+    else:
+        job_records = read_json_records(jobs_path)
+        jobs, job_ids = _accepted_with_ids(job_records, validate_jobs(job_records), "job")
+    model = load_model()
+
+    jobs_per_talent = len(job_ids) if top_k is None else min(top_k, len(job_ids))
+    n_results = len(talents) * jobs_per_talent
+    chunks = [(start, talents[start:start + chunk_size]) for start in range(0, len(talents), chunk_size)]
+    writer = _JsonLinesWriter(output_path) if output_format == "jsonl" else \
+        _ColumnarWriter(output_path, talent_ids, job_ids, n_results,
+                        compact_result_dtype(model.classifier.classes_.dtype))
+
+    score_chunk = _score_chunk_as_json_lines if output_format == "jsonl" else _score_chunk
+    executor = None
+    scored_talents = 0
+    try:
+        if workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                           initargs=(jobs, jobs_path, top_k, talent_ids, job_ids))
+        else:
+            _init_worker(jobs, jobs_path, top_k, talent_ids, job_ids, model)
+        # results are returned in order of the chunks, while later chunks are already being scored. Only a few chunks
+        # are in flight, so that results do not pile up if writing is slower than scoring
+        results = map_chunks(score_chunk, chunks, executor, 2 * workers)
+        for (_, chunk_talents), result in zip(chunks, results):
+            writer.write(result)
+            scored_talents += len(chunk_talents)
+            if progress:
+                elapsed = max(time.time() - start_time, 1e-6)
+                print(f"Scored {scored_talents} of {len(talents)} talents, {writer.written} results written, "
+                      f"~ {scored_talents * len(job_ids) / elapsed:.0f} combinations per second")
+    finally:
+        writer.close()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    print(f"Successfully wrote {writer.written} results for {len(talents)} talents and {len(job_ids)} jobs to "
+          f"{output_path}, took ~ {round(time.time() - start_time)} seconds.")
+    return writer.written
+
+
+def top_per_talent(result: np.ndarray, top_k: int = None) -> np.ndarray:
+    """
+    Ranks the jobs per talent by the calibrated probability of being a match.
+
+    :param result: structured array as returned by Model.predict_bulk_compact
+    :param top_k: number of best jobs to keep per talent, if None all are kept
+    :return: structured array sorted by talent_index and descending by probability, at most top_k rows per talent
+    """
+    # lexsort is stable and sorts by the last key first, so equal probabilities keep the order by score
+    result = result[np.lexsort((-result["probability"], result["talent_index"]))]
+    if top_k is None:
+        return result
+    talent_index = result["talent_index"]
+    rank = np.arange(len(result)) - np.searchsorted(talent_index, talent_index)
+    return result[rank < top_k]
+
+
+def _accepted_with_ids(records: list[dict], validation: ValidationResult, kind: str) -> tuple[list, np.ndarray]:
+    """
+    Reports invalid records and keeps the accepted ones along with their ids.
+    :param records: raw records as read from the file
+    :param validation: result of validating the records
+    :param kind: 'talent' or 'job', used for reporting
+    :return: tuple of the normalized Talent or Job objects of the accepted records and the id per accepted record
+    """
+    for error in validation.errors:
+        print(f"Invalid {kind} {error.index}: {error.field} {error.message} "
+              f"({'replaced by default' if error.defaulted else 'skipped'})")
+    ids = np.array([str(records[index].get("id", index)) for index in validation.indices], dtype=str)
+    return validation.records, ids
+
+
+def _init_worker(jobs: list[Job], jobs_path: str, top_k: int, talent_ids: np.ndarray, job_ids: np.ndarray,
+                 model: Model = None) -> None:
+    """
+    Loads the model and encodes the jobs and the ids (for JSON lines) once per process.
+    :param jobs: validated jobs, or None if jobs_path is a job store
+    :param jobs_path: directory of the job store, used if jobs is None
+    :param top_k: number of best jobs to keep per talent, if None all are kept
+    :param talent_ids: id per talent_index
+    :param job_ids: id per job_index
+    :param model: the already loaded model (when scoring in this process), if None it is loaded
+    :return: None
+    """
+    model = model or load_model()
+    if jobs is None:
+        job_store = JobStore.load(jobs_path, model.feature_extractor)
+        job_encoding, n_jobs = job_store.job_encoding, len(job_store)
+    else:
+        job_encoding, n_jobs = model.feature_extractor.encode_jobs(jobs), len(jobs)
+    _worker.update(model=model, job_encoding=job_encoding, n_jobs=n_jobs, top_k=top_k,
+                   talent_ids=[json.dumps(talent_id) for talent_id in talent_ids.tolist()],
+                   job_ids=[json.dumps(job_id) for job_id in job_ids.tolist()])
+
+
+def _score_chunk(chunk: tuple[int, list[Talent]]) -> np.ndarray:
+    """
+    Scores one chunk of talents against all jobs.
+    :param chunk: tuple of the position of the first talent and the validated talents of the chunk
+    :return: structured array as returned by top_per_talent, talent_index refers to all talents
+    """
+    start, talents = chunk
+    talent_index, job_index = cross_product_pairs(len(talents), _worker["n_jobs"])
+    prediction = _worker["model"].predict_validated_pairs(talents, _worker["job_encoding"], _worker["n_jobs"],
+                                                          (talent_index, job_index))
+    return top_per_talent(compact_result(talent_index + start, job_index, *prediction), _worker["top_k"])
+
+
+def _score_chunk_as_json_lines(chunk: tuple[int, list[Talent]]) -> tuple[int, str]:
+    """
+    Scores one chunk like _score_chunk, but encodes the results as JSON lines already, i.e. in the worker process.
+    :param chunk: tuple of the position of the first talent and the validated talents of the chunk
+    :return: tuple of the number of results and their JSON lines
+    """
+    result = _score_chunk(chunk)
+    talent_ids, job_ids = _worker["talent_ids"], _worker["job_ids"]
+    # ids are encoded once per process, the same for labels per chunk, which leaves formatting the numbers
+    labels = {label: json.dumps(label) for label in np.unique(result["label"]).tolist()}
+    lines = [f'{{"talent_id": {talent_ids[talent_index]}, "job_id": {job_ids[job_index]}, '
+             f'"label": {labels[label]}, "score": {score!r}, "probability": {probability!r}}}\n'
+             for talent_index, job_index, label, score, probability in result.tolist()]
+    return len(lines), "".join(lines)
+
+
+class _JsonLinesWriter:
+    """
+    Writes results as one JSON object per line.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Initialize an object of _JsonLinesWriter, opening the file.
+        :param path: file to write to
+        """
+        self.file = open(path, "w")
+        self.written = 0
+
+    def write(self, encoded: tuple[int, str]) -> None:
+        """
+        Append results to the file.
+        :param encoded: results as returned by _score_chunk_as_json_lines
+        :return: None
+        """
+        n_results, lines = encoded
+        self.file.write(lines)
+        self.written += n_results
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class _ColumnarWriter:
+    """
+    Writes results into one preallocated, memory-mapped numpy file per field.
+    """
+
+    def __init__(self, path: str, talent_ids: np.ndarray, job_ids: np.ndarray, n_results: int,
+                 dtype: np.dtype) -> None:
+        """
+        Initialize an object of _ColumnarWriter, saving the ids and creating all columns (also if nothing is written).
+        :param path: directory to write to
+        :param talent_ids: id per talent_index
+        :param job_ids: id per job_index
+        :param n_results: total number of results to be written
+        :param dtype: structured dtype of the results (see compact_result_dtype), one column per field
+        """
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, TALENT_IDS_FILE_NAME), talent_ids)
+        np.save(os.path.join(path, JOB_IDS_FILE_NAME), job_ids)
+        self.columns = {name: np.lib.format.open_memmap(os.path.join(path, f"{name}.npy"), mode="w+",
+                                                        dtype=dtype[name], shape=(n_results,))
+                        for name in dtype.names}
+        self.written = 0
+
+    def write(self, result: np.ndarray) -> None:
+        """
+        Fill the next rows of each column with the results.
+        :param result: structured array as returned by top_per_talent
+        :return: None
+        """
+        for name, column in self.columns.items():
+            column[self.written:self.written + len(result)] = result[name]
+        self.written += len(result)
+
+    def close(self) -> None:
+        for column in self.columns.values():
+            column.flush()
+
+
+def _positive_int(value: str) -> int:
+    """
+    Argument type for options which have to be a positive integer.
+    :param value: raw command line value
+    :return: the integer
+    :raises argparse.ArgumentTypeError: if the value is not a positive integer
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value!r}")
+    return number
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score all combinations of talents and jobs with the trained model.")
+    parser.add_argument("talents", help="file with raw talents, either a JSON array or JSON lines")
+    parser.add_argument("jobs", help="file with raw jobs, either a JSON array or JSON lines, or a job store directory")
+    parser.add_argument("output", help="file (jsonl) or directory (npy) to write the results to")
+    parser.add_argument("--format", choices=["jsonl", "npy"], default="jsonl",
+                        help="JSON lines or one numpy file per field (default: jsonl)")
+    parser.add_argument("--workers", type=_positive_int, default=os.cpu_count() or 1,
+                        help="number of processes scoring in parallel (default: number of CPUs)")
+    parser.add_argument("--chunk-size", type=_positive_int, default=64,
+                        help="number of talents scored against all jobs at once (default: 64)")
+    parser.add_argument("--top-k", type=_positive_int, default=None,
+                        help="number of best jobs to keep per talent (default: all)")
+    parser.add_argument("--no-progress", action="store_true", help="do not print progress and throughput")
+    arguments = parser.parse_args()
+    score_files(arguments.talents, arguments.jobs, arguments.output, arguments.format, arguments.workers,
+                arguments.chunk_size, arguments.top_k, not arguments.no_progress)
@@ -2,12 +2,23 @@
 Provides methods for reading and first preprocessing of raw input data plus some utils functions.
 """
 
+import hashlib
 import importlib.resources as resources
+import io
+import json
+import os
+import re
+from collections import deque
+from concurrent.futures import Executor
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
 
+import numpy as np
 import pandas as pd
 
-from data.data_types import Job
-from data.data_types import Talent
+from data.data_validation import validate_jobs
+from data.data_validation import validate_talents
 
 
 def read_raw_data():
@@ -28,33 +39,281 @@ def read_raw_data():
     return df
 
 
+# whitespace between json values, as skipped by the json module itself
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def iterate_raw_data(chunk_size: int = 10_000, block_size: int = 1024 * 1024):
+    """
+    Streams the raw records in chunks, so that (unlike read_raw_data) the raw data never has to fit into memory.
+    :param chunk_size: number of records per chunk
+    :param block_size: number of characters read from the file at once
+    :return: generator of lists of raw json records (dictionaries with talent, job and label), one list per chunk
+    :raises OSError: if e.g. the file is not there
+    :raises ValueError: if the raw data is not a json array
+    """
+    decoder = json.JSONDecoder()
+    path = resources.path("data_files.raw", "data.json")
+    with open(path.as_posix()) as file:
+        buffer = file.read(block_size)
+        position = _WHITESPACE.match(buffer).end()
+        if buffer[position:position + 1] != "[":
+            raise ValueError(f"Expected a json array in {path}")
+        position += 1
+        chunk = []
+        end_of_file = False
+        while True:
+            position = _WHITESPACE.match(buffer, position).end()
+            if buffer.startswith(",", position):
+                position = _WHITESPACE.match(buffer, position + 1).end()
+            if buffer.startswith("]", position):
+                break
+            try:
+                record, position_after = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # the record continues in the next block, unless there is none
+                if end_of_file:
+                    raise
+                block = file.read(block_size)
+                end_of_file = not block
+                buffer = buffer[position:] + block
+                position = 0
+                continue
+            chunk.append(record)
+            position = position_after
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def map_chunks(function: Callable, chunks: Iterable, executor: Executor = None, in_flight: int = 2) -> Iterator:
+    """
+    Applies a function to streamed chunks in order. Unlike executor.map, which submits all chunks at once, at most
+    in_flight chunks are held by the executor, so that neither the chunks nor their results pile up in memory.
+    :param function: function to apply to each chunk, has to be picklable when using an executor
+    :param chunks: iterable of chunks
+    :param executor: executor to run the function in, if None it runs in this process
+    :param in_flight: maximum number of submitted chunks, whose result has not been returned yet
+    :return: generator of the results in order of the chunks
+    """
+    if executor is None:
+        yield from map(function, chunks)
+        return
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(function, chunk))
+        if len(pending) >= in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def locate_raw_data_end() -> int:
+    """
+    Locates the end of the last record in the raw data, i.e. the position right after its closing brace. Records
+    appended later start after this position (see read_raw_data_from).
+    :return: byte offset in the raw data file
+    :raises OSError: if e.g. the file is not there
+    """
+    path = resources.path("data_files.raw", "data.json")
+    with open(path.as_posix(), "rb") as file:
+        size = file.seek(0, os.SEEK_END)
+        block_start = max(0, size - 64 * 1024)
+        file.seek(block_start)
+        block = file.read()
+    # the closing bracket of the array, followed by whitespace only
+    end = block.rfind(b"]")
+    return block_start + len(block[:end].rstrip())
+
+
+def fingerprint_raw_data_before(offset: int) -> str:
+    """
+    Fingerprints all bytes of the raw data before the given offset, e.g. to check that raw data up to the offset has
+    not been rewritten (including e.g. relabeled records). The bytes are hashed in blocks without being parsed, which
+    is cheap compared to reading the records.
+    :param offset: byte offset in the raw data file (see locate_raw_data_end)
+    :return: hex digest, None if the file is shorter than the offset
+    :raises OSError: if e.g. the file is not there
+    """
+    path = resources.path("data_files.raw", "data.json")
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path.as_posix(), "rb") as file:
+        if file.seek(0, os.SEEK_END) < offset:
+            return None
+        file.seek(0)
+        remaining = offset
+        while remaining > 0:
+            block = file.read(min(remaining, 1024 * 1024))
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+def read_raw_data_from(offset: int) -> pd.DataFrame:
+    """
+    Reads only the raw records after the given offset, i.e. records appended since the offset has been located.
+    :param offset: byte offset in the raw data file (see locate_raw_data_end)
+    :return: DataFrame as returned by read_raw_data, but only with the appended records
+    :raises OSError: if e.g. the file is not there
+    """
+    path = resources.path("data_files.raw", "data.json")
+    try:
+        with open(path.as_posix(), "rb") as file:
+            file.seek(offset)
+            appended = file.read().decode().strip()
+        # what follows the last known record: ',' + further records + the closing bracket of the array
+        appended = appended.removeprefix(",").removesuffix("]")
+        df = pd.read_json(io.StringIO(f"[{appended}]"), orient="records")
+    except OSError:
+        print(f"Failed to read data from {path}")
+        raise
+    else:
+        print(f"Successfully read {df.shape[0]} appended rows from {path}")
+    return df
+
+
 def read_and_prepare_raw_data(drop_source: bool = True, write_interim_data: bool = False) -> pd.DataFrame:
     """
     Reads the raw data from internal data source and adds columns for Job and Talent, the internal representation
 
     Afterward the columns for job and talent contain the new internal representation. The source data can be found
-    in 'talent_source' and 'job_source' respectively.
+    in 'talent_source' and 'job_source' respectively. Raw data is validated and normalized (see data_validation),
+    rows with a talent or job which had to be rejected are dropped.
 
     :param drop_source: if True, then the source columns for talent and job are dropped.
     :param write_interim_data: if True, then the new DataFrame is also written to the internal data repository
     :return: a DataFrame with new columns added for classes Job and Talent
     """
-    df = read_raw_data()
+    df = prepare_raw_data(read_raw_data(), drop_source)
+
+    if write_interim_data:
+        write_data_frame_to_resources(df, "data_files.interim", "data_internal_representation.csv")
+
+    return df
+
+
+def prepare_raw_data(df: pd.DataFrame, drop_source: bool = True) -> pd.DataFrame:
+    """
+    Replaces the raw json data in the columns for job and talent by Job and Talent, the internal representation.
+
+    See read_and_prepare_raw_data, but for raw data which has already been read (e.g. only newly added rows).
+
+    :param df: DataFrame with raw json data as returned by read_raw_data
+    :param drop_source: if True, then the source columns for talent and job are dropped.
+    :return: a DataFrame with new columns added for classes Job and Talent
+    """
     print("Add columns for Job and Talent, the internal representation of raw json data")
+    jobs = validate_jobs(list(df["job"]))
+    talents = validate_talents(list(df["talent"]))
+    for kind, validation in (("job", jobs), ("talent", talents)):
+        for error in validation.errors:
+            print(f"Invalid {kind} in row {error.index}: {error.field} {error.message} "
+                  f"({'replaced by default' if error.defaulted else 'row dropped'})")
+
+    # keep the rows where both, talent and job, have been accepted
+    job_per_row = dict(zip(jobs.indices, jobs.records))
+    talent_per_row = dict(zip(talents.indices, talents.records))
+    accepted = [row for row in range(df.shape[0]) if row in job_per_row and row in talent_per_row]
+    df = df.iloc[accepted].reset_index(drop=True)
     if not drop_source:
         df["job_source"] = df["job"]
-    df["job"] = df.apply(lambda row: Job.create(row["job"]), 1)
+    df["job"] = [job_per_row[row] for row in accepted]
     if not drop_source:
         df["talent_source"] = df["talent"]
-    df["talent"] = df.apply(lambda row: Talent.create(row["talent"]), 1)
+    df["talent"] = [talent_per_row[row] for row in accepted]
+
+    return df
 
-    if write_interim_data:
-        write_data_frame_to_resources(df, "data_files.interim", "data_internal_representation.csv")
 
+def read_data_frame_from_resources(package_name: str, file_name: str) -> pd.DataFrame:
+    """
+    Read a DataFrame previously written by write_data_frame_to_resources.
+
+    :param package_name: Name of the package to read from
+    :param file_name: File name to use
+    :return: DataFrame read
+    :raises OSError: If e.g. the file is not there
+    """
+    path = resources.path(package_name, file_name)
+    try:
+        df = pd.read_csv(path.as_posix())
+    except OSError:
+        print(f"Failed to read DataFrame from {path}")
+        raise
+    else:
+        print(f"Successfully read {df.shape[0]} rows from {path}")
     return df
 
 
-def write_data_frame_to_resources(df: pd.DataFrame, package_name: str, file_name: str) -> None:
+def memory_map_data_frame_from_resources(package_name: str, file_name: str,
+                                         chunk_size: int = 100_000) -> tuple[np.ndarray, list[str]]:
+    """
+    Memory-map a numerical DataFrame previously written by write_data_frame_to_resources.
+
+    The csv file is converted chunk by chunk into a numpy file next to it (same name with suffix .npy), unless that one
+    is already up-to-date. Hence, the DataFrame never has to fit into memory. Boolean columns are mapped to 0 and 1.
+
+    :param package_name: Name of the package to read from
+    :param file_name: File name of the csv file
+    :param chunk_size: number of rows converted at once
+    :return: tuple of read-only memory-mapped matrix and the column names
+    :raises OSError: If e.g. the file is not there
+    """
+    path = resources.path(package_name, file_name)
+    npy_path = os.path.splitext(path.as_posix())[0] + ".npy"
+    try:
+        columns = list(pd.read_csv(path.as_posix(), nrows=0).columns)
+        if not os.path.exists(npy_path) or os.path.getmtime(npy_path) < os.path.getmtime(path.as_posix()):
+            with open(path.as_posix(), "rb") as file:
+                n_rows = sum(1 for _ in file) - 1
+            matrix = np.lib.format.open_memmap(npy_path, mode="w+", dtype=np.float64, shape=(n_rows, len(columns)))
+            start = 0
+            for chunk in pd.read_csv(path.as_posix(), chunksize=chunk_size):
+                matrix[start:start + chunk.shape[0]] = chunk.to_numpy(dtype=np.float64)
+                start += chunk.shape[0]
+            matrix.flush()
+            del matrix
+            print(f"Successfully converted {n_rows} rows from {path} to {npy_path}")
+        matrix = np.load(npy_path, mmap_mode="r")
+    except OSError:
+        print(f"Failed to memory-map DataFrame from {path}")
+        raise
+    return matrix, columns
+
+
+def resource_size(package_name: str, file_name: str) -> int:
+    """
+    Size of a file in the resources.
+    :param package_name: Name of the package of the file
+    :param file_name: File name to use
+    :return: size in bytes, 0 if the file does not exist
+    """
+    path = resources.path(package_name, file_name)
+    return os.path.getsize(path.as_posix()) if os.path.exists(path.as_posix()) else 0
+
+
+def truncate_resource(package_name: str, file_name: str, size: int) -> None:
+    """
+    Truncates a file in the resources, e.g. to drop rows appended after the given size.
+    :param package_name: Name of the package of the file
+    :param file_name: File name to use
+    :param size: size in bytes to truncate to, has to be at most the current size
+    :return: None
+    :raises OSError: If something went wrong during truncating
+    """
+    path = resources.path(package_name, file_name)
+    try:
+        if os.path.getsize(path.as_posix()) > size:
+            os.truncate(path.as_posix(), size)
+            print(f"Truncated {path} to {size} bytes")
+    except OSError:
+        print(f"Failed to truncate {path}")
+        raise
+
+
+def write_data_frame_to_resources(df: pd.DataFrame, package_name: str, file_name: str, append: bool = False) -> None:
     """
     Write the specified DataFrame to the specified Path.
 
@@ -63,15 +322,16 @@ def write_data_frame_to_resources(df: pd.DataFrame, package_name: str, file_name
     :param df: Instance of DataFrame to write
     :param package_name: Name of the package to write to
     :param file_name: File name to use
+    :param append: if True, the rows are appended to the existing file (with the same columns)
     :return: None
     :raises OSErrror: If something went wrong during writing
     """
 
     path = resources.path(package_name, file_name)
     try:
-        df.to_csv(path.as_posix(), index=False)
+        df.to_csv(path.as_posix(), index=False, mode="a" if append else "w", header=not append)
     except OSError:
         print(f"Failed to write DataFrame to {path}")
         raise
     else:
-        print(f"Successfully wrote DataFrame to {path}")
+        print(f"Successfully {'appended' if append else 'wrote'} DataFrame to {path}")
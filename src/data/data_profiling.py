@@ -0,0 +1,368 @@
+"""
+Provides a profile of the field distributions of talents and jobs in the raw data, e.g. for exploratory analysis.
+
+The raw json data is encoded only once into a cached, numerical dataset next to the processed data (one numpy file per
+array plus profile.json with the vocabularies). It is rebuilt whenever the raw data is newer. Vocabularies (roles,
+languages, ratings, seniorities and degrees) are taken from the data itself and raw values are profiled without
+validation, so that unexpected values and missing fields show up instead of being defaulted:
+
+* roles: packed bit set per record over the role vocabulary
+* languages: rating code per record and language (-1 if not present), for jobs also the must_have flag
+* seniority: bit set per record over the seniority vocabulary plus 'none' (a talent has exactly one bit set)
+* degree: code per record, -1 if missing
+* salary: float per record, NaN if missing
+
+Building the dataset streams the raw records twice in chunks (see iterate_raw_data), so memory is bounded by the chunk
+size instead of the size of the raw data: the vocabularies of all chunks are collected and merged first, then each
+chunk is encoded into the preallocated memory-mapped arrays. Both passes run in parallel processes, with only a few
+chunks in flight at once.
+
+All distributions are then computed by vectorized counting over chunks of the memory-mapped arrays, in parallel
+processes. Counts of the chunks are simply summed up, only the salary quantiles are computed on the whole column.
+"""
+
+import importlib.resources as resources
+import json
+import numbers
+import os
+import time
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data.data_io import iterate_raw_data
+from data.data_io import map_chunks
+
+PROFILE_FILE_NAME = "profile.json"
+SALARY_QUANTILES = [0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0]
+
+# name of the raw field per profiled property and side
+FIELDS = {
+    "talent": {"job_roles": "job_roles", "languages": "languages", "seniority": "seniority", "degree": "degree",
+               "salary": "salary_expectation"},
+    "job": {"job_roles": "job_roles", "languages": "languages", "seniority": "seniorities", "degree": "min_degree",
+            "salary": "max_salary"}
+}
+
+
+def profile_data(workers: int = None, chunk_size: int = 100_000, raw_chunk_size: int = 10_000) -> dict[str, dict]:
+    """
+    Profiles talents and jobs of the raw data, see module description.
+
+    :param workers: number of processes encoding and counting chunks in parallel, by default the number of CPUs. 1 does
+        everything in this process
+    :param chunk_size: number of encoded records counted at once
+    :param raw_chunk_size: number of raw records parsed and encoded at once, if the encoded dataset has to be rebuilt
+    :return: dictionary with one profile per side ('talent' and 'job'), each a dictionary with
+        'records' (number of records),
+        'missing' (Series with the number of records without a given value per raw field, 'none' is not given),
+        'job_roles' and 'languages' (Series with the number of records per value),
+        'language_ratings' (DataFrame with the number of records per language and rating),
+        'must_have' (jobs only, Series with the number of jobs requiring a language),
+        'seniorities' and 'degrees' (Series with the number of records per value, 'none' for seniority not given),
+        'salary' (Series with quantiles of the salary) and
+        'seniority_roles' (DataFrame with the number of records per seniority and role)
+    :raises OSError: If something went wrong during reading the raw data or the encoded dataset
+    """
+    start_time = time.time()
+    workers = workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        vocabularies, n_records = load_encoded_profile_data(raw_chunk_size, executor, 2 * workers)
+        chunks = [(side, start, min(start + chunk_size, n_records), vocabularies) for side in FIELDS
+                  for start in range(0, n_records, chunk_size)]
+        if executor is not None and len(chunks) > 1:
+            counts = list(executor.map(_count_chunk, chunks))
+        else:
+            counts = [_count_chunk(chunk) for chunk in chunks]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    profiles = {}
+    for side, fields in FIELDS.items():
+        side_counts = [count for chunk, count in zip(chunks, counts) if chunk[0] == side]
+        total = {key: sum(count[key] for count in side_counts) for key in side_counts[0]} if side_counts else \
+            _count(_load_arrays(side), vocabularies)
+        profiles[side] = _profile(side, fields, total, vocabularies, n_records)
+    print(f"Profiled {n_records} records with {workers} worker(s), took ~ {round(time.time() - start_time, 1)} "
+          f"seconds.")
+    return profiles
+
+
+def load_encoded_profile_data(chunk_size: int = 10_000, executor: Executor = None,
+                              in_flight: int = 2) -> tuple[dict, int]:
+    """
+    Encodes the raw data for profiling (see module description), unless the cached encoding is up-to-date.
+    :param chunk_size: number of raw records parsed and encoded at once
+    :param executor: executor to collect vocabularies and encode chunks in parallel, if None all runs in this process
+    :param in_flight: maximum number of chunks submitted to the executor and not yet collected
+    :return: tuple of the vocabularies and the number of records
+    :raises OSError: If something went wrong during reading the raw data or writing the encoded dataset
+    """
+    path = resources.path("data_files.processed", PROFILE_FILE_NAME)
+    raw_path = resources.path("data_files.raw", "data.json")
+    try:
+        if os.path.exists(path.as_posix()) and \
+                os.path.getmtime(path.as_posix()) >= os.path.getmtime(raw_path.as_posix()):
+            with open(path.as_posix()) as file:
+                manifest = json.load(file)
+            return manifest["vocabularies"], manifest["records"]
+
+        # first pass: the vocabularies have to be complete before any chunk can be encoded
+        n_records = 0
+        values = {"roles": set(), "languages": set(), "ratings": set(), "seniorities": set(), "degrees": set()}
+        for chunk_records, chunk_values in map_chunks(_chunk_vocabularies, iterate_raw_data(chunk_size), executor,
+                                                      in_flight):
+            n_records += chunk_records
+            for key, value in chunk_values.items():
+                values[key].update(value)
+        vocabularies = {key: sorted(value) for key, value in values.items()}
+
+        # second pass: encode the chunks into arrays preallocated with the shape and type of an empty encoding
+        arrays = {side: {key: np.lib.format.open_memmap(_array_path(side, key), mode="w+", dtype=empty.dtype,
+                                                        shape=(n_records,) + empty.shape[1:])
+                         for key, empty in _encode([], FIELDS[side], vocabularies).items()}
+                  for side in FIELDS}
+        start = 0
+        chunks = ((records, vocabularies) for records in iterate_raw_data(chunk_size))
+        for encoded in map_chunks(_encode_chunk, chunks, executor, in_flight):
+            stop = start + len(encoded["talent"]["degrees"])
+            for side, side_arrays in arrays.items():
+                for key, array in side_arrays.items():
+                    array[start:stop] = encoded[side][key]
+            start = stop
+        for side_arrays in arrays.values():
+            for array in side_arrays.values():
+                array.flush()
+        # written last, so that an interrupted encoding is not taken as up-to-date
+        with open(path.as_posix(), "w") as file:
+            json.dump({"records": n_records, "vocabularies": vocabularies}, file, indent=2)
+    except OSError:
+        print(f"Failed to encode raw data for profiling to {path}")
+        raise
+    else:
+        print(f"Successfully encoded {n_records} records for profiling to {path}")
+    return vocabularies, n_records
+
+
+def _chunk_vocabularies(records: list) -> tuple[int, dict[str, set]]:
+    """
+    Collects the values of all categorical fields of talents and jobs in one chunk of raw records.
+    :param records: raw json records as returned by iterate_raw_data
+    :return: tuple of the number of records and a dictionary with sets of roles, languages, ratings, seniorities and
+        degrees
+    """
+    values = {"roles": set(), "languages": set(), "ratings": set(), "seniorities": set(), "degrees": set()}
+    for side, fields in FIELDS.items():
+        for record in _side(records, side):
+            record = record if isinstance(record, dict) else {}
+            values["roles"].update(role for role in _list(record, fields["job_roles"]) if isinstance(role, str))
+            for title, rating, _ in _languages(record):
+                values["languages"].add(title)
+                values["ratings"].add(rating)
+            seniorities = record.get(fields["seniority"], None)
+            for seniority in seniorities if isinstance(seniorities, list) else [seniorities]:
+                if _given(seniority):
+                    values["seniorities"].add(seniority)
+            if _given(record.get(fields["degree"], None)):
+                values["degrees"].add(record[fields["degree"]])
+    return len(records), values
+
+
+def _encode_chunk(chunk: tuple[list, dict]) -> dict[str, dict[str, np.ndarray]]:
+    """
+    Encodes talents and jobs of one chunk of raw records, meant to run in a worker process.
+    :param chunk: tuple of the raw json records (see iterate_raw_data) and the merged vocabularies
+    :return: dictionary with the encoded arrays per side (see _encode)
+    """
+    records, vocabularies = chunk
+    return {side: _encode(_side(records, side), fields, vocabularies) for side, fields in FIELDS.items()}
+
+
+def _encode(records: list, fields: dict, vocabularies: dict) -> dict[str, np.ndarray]:
+    """
+    Encodes the raw records of one side, see module description.
+    :param records: raw json records
+    :param fields: name of the raw field per profiled property (see FIELDS)
+    :param vocabularies: merged vocabularies with sorted lists of values (see load_encoded_profile_data)
+    :return: dictionary of arrays with one row per record
+    """
+    role_columns = {role: column for column, role in enumerate(vocabularies["roles"])}
+    language_columns = {language: column for column, language in enumerate(vocabularies["languages"])}
+    rating_codes = {rating: code for code, rating in enumerate(vocabularies["ratings"])}
+    seniority_columns = {seniority: column for column, seniority in enumerate(vocabularies["seniorities"])}
+    degree_codes = {degree: code for code, degree in enumerate(vocabularies["degrees"])}
+
+    n = len(records)
+    roles = np.zeros((n, len(role_columns)), dtype=bool)
+    ratings = np.full((n, len(language_columns)), -1, dtype=np.int8)
+    must_have = np.zeros((n, len(language_columns)), dtype=bool)
+    # last column: seniority not given ('none')
+    seniorities = np.zeros((n, len(seniority_columns) + 1), dtype=bool)
+    degrees = np.full(n, -1, dtype=np.int16)
+    salaries = np.full(n, np.nan)
+    for row, record in enumerate(records):
+        record = record if isinstance(record, dict) else {}
+        for role in _list(record, fields["job_roles"]):
+            if isinstance(role, str):
+                roles[row, role_columns[role]] = True
+        for title, rating, required in _languages(record):
+            ratings[row, language_columns[title]] = rating_codes[rating]
+            must_have[row, language_columns[title]] = required
+        values = record.get(fields["seniority"], None)
+        for seniority in values if isinstance(values, list) and values else [values]:
+            seniorities[row, seniority_columns[seniority] if _given(seniority) else -1] = True
+        degree = record.get(fields["degree"], None)
+        if _given(degree):
+            degrees[row] = degree_codes[degree]
+        salary = record.get(fields["salary"], None)
+        if isinstance(salary, numbers.Real) and not isinstance(salary, bool):
+            salaries[row] = salary
+    return {"roles": np.packbits(roles, axis=1), "ratings": ratings, "must_have": must_have,
+            "seniorities": seniorities, "degrees": degrees, "salaries": salaries}
+
+
+def _count_chunk(chunk: tuple[str, int, int, dict]) -> dict[str, np.ndarray]:
+    """
+    Counts one chunk of the encoded records of one side, meant to run in a worker process.
+    :param chunk: tuple of side, first and last (exclusive) record and the vocabularies
+    :return: see _count
+    """
+    side, start, stop, vocabularies = chunk
+    return _count({key: array[start:stop] for key, array in _load_arrays(side).items()}, vocabularies)
+
+
+def _count(arrays: dict[str, np.ndarray], vocabularies: dict) -> dict[str, np.ndarray]:
+    """
+    Counts the values of encoded records in one vectorized pass per array.
+    :param arrays: encoded records (see _encode)
+    :param vocabularies: merged vocabularies with sorted lists of values (see load_encoded_profile_data)
+    :return: dictionary of count arrays, which can be summed up over chunks
+    """
+    roles = np.unpackbits(arrays["roles"], axis=1, count=len(vocabularies["roles"])).astype(np.int64)
+    ratings = np.asarray(arrays["ratings"])
+    present = ratings >= 0
+    n_ratings = len(vocabularies["ratings"])
+    # histogram per language and rating in one bincount over 'language * n_ratings + rating'
+    rating_keys = (np.arange(ratings.shape[1]) * n_ratings + ratings)[present]
+    seniorities = np.asarray(arrays["seniorities"]).astype(np.int64)
+    degrees = np.asarray(arrays["degrees"])
+    salaries = np.asarray(arrays["salaries"])
+    return {
+        "roles": roles.sum(axis=0),
+        "missing_roles": np.array((roles.sum(axis=1) == 0).sum()),
+        "languages": present.sum(axis=0),
+        "missing_languages": np.array((~present.any(axis=1)).sum()),
+        "ratings": np.bincount(rating_keys, minlength=ratings.shape[1] * n_ratings)
+        .reshape(ratings.shape[1], n_ratings),
+        "must_have": np.asarray(arrays["must_have"]).sum(axis=0),
+        "seniorities": seniorities.sum(axis=0),
+        "missing_seniorities": np.array((seniorities[:, :-1].sum(axis=1) == 0).sum()),
+        "seniority_roles": seniorities.T @ roles,
+        "degrees": np.bincount(degrees + 1, minlength=len(vocabularies["degrees"]) + 1),
+        "missing_salaries": np.array(np.isnan(salaries).sum()),
+    }
+
+
+def _profile(side: str, fields: dict, counts: dict, vocabularies: dict, n_records: int) -> dict:
+    """
+    Labels the summed counts of one side, see profile_data.
+    :param side: 'talent' or 'job'
+    :param fields: name of the raw field per profiled property (see FIELDS)
+    :param counts: counts summed over all chunks (see _count)
+    :param vocabularies: merged vocabularies with sorted lists of values (see load_encoded_profile_data)
+    :param n_records: number of records
+    :return: profile of the side
+    """
+    seniority_labels = vocabularies["seniorities"] + ["none"]
+    # values which only occur on the other side are dropped
+    roles = pd.Index(vocabularies["roles"])[counts["roles"] > 0]
+    languages = pd.Index(vocabularies["languages"])[counts["languages"] > 0]
+    salaries = np.load(_array_path(side, "salaries"), mmap_mode="r")
+    profile = {
+        "records": n_records,
+        "missing": pd.Series({fields["job_roles"]: int(counts["missing_roles"]),
+                              fields["languages"]: int(counts["missing_languages"]),
+                              fields["seniority"]: int(counts["missing_seniorities"]),
+                              fields["degree"]: int(counts["degrees"][0]),
+                              fields["salary"]: int(counts["missing_salaries"])}),
+        "job_roles": pd.Series(counts["roles"], index=vocabularies["roles"])[roles].sort_values(ascending=False),
+        "languages": pd.Series(counts["languages"], index=vocabularies["languages"])[languages]
+        .sort_values(ascending=False),
+        "language_ratings": pd.DataFrame(counts["ratings"], index=vocabularies["languages"],
+                                         columns=vocabularies["ratings"]).loc[languages],
+        "seniorities": pd.Series(counts["seniorities"], index=seniority_labels),
+        "degrees": pd.Series(counts["degrees"][1:], index=vocabularies["degrees"]),
+        "salary": pd.Series(np.nanquantile(salaries, SALARY_QUANTILES) if counts["missing_salaries"] < n_records
+                            else np.full(len(SALARY_QUANTILES), np.nan), index=SALARY_QUANTILES),
+        "seniority_roles": pd.DataFrame(counts["seniority_roles"], index=seniority_labels,
+                                        columns=vocabularies["roles"]).loc[:, roles],
+    }
+    if side == "job":
+        profile["must_have"] = pd.Series(counts["must_have"], index=vocabularies["languages"])[languages]
+    return profile
+
+
+def _load_arrays(side: str) -> dict[str, np.ndarray]:
+    """
+    Memory-maps the encoded records of one side.
+    :param side: 'talent' or 'job'
+    :return: dictionary of read-only memory-mapped arrays
+    """
+    return {key: np.load(_array_path(side, key), mmap_mode="r")
+            for key in ["roles", "ratings", "must_have", "seniorities", "degrees", "salaries"]}
+
+
+def _array_path(side: str, key: str) -> str:
+    """
+    Path of an encoded array.
+    :param side: 'talent' or 'job'
+    :param key: name of the array
+    :return: path of the numpy file
+    """
+    return resources.path("data_files.processed", f"profile.{side}.{key}.npy").as_posix()
+
+
+def _side(records: list, side: str) -> list:
+    """
+    Talents or jobs of raw records.
+    :param records: raw json records with talent, job and label
+    :param side: 'talent' or 'job'
+    :return: list of the raw records of the side, None where a record is not a dictionary
+    """
+    return [record.get(side, None) if isinstance(record, dict) else None for record in records]
+
+
+def _list(record: dict, field: str) -> list:
+    """
+    Value of a list field, an empty list if it is missing or not a list.
+    :param record: raw json record
+    :param field: name of the field
+    :return: list of raw values
+    """
+    value = record.get(field, None)
+    return value if isinstance(value, list) else []
+
+
+def _languages(record: dict) -> list[tuple[str, str, bool]]:
+    """
+    Languages of a record with title and rating, other entries are skipped.
+    :param record: raw json record
+    :return: list of tuples with title, rating and must_have
+    """
+    return [(entry["title"], entry["rating"], bool(entry.get("must_have", False)))
+            for entry in _list(record, "languages")
+            if isinstance(entry, dict) and isinstance(entry.get("title", None), str)
+            and isinstance(entry.get("rating", None), str)]
+
+
+def _given(value) -> bool:
+    """
+    Checks whether a categorical value is given, i.e. neither missing nor 'none'.
+    :param value: raw value
+    :return: True if the value is given
+    """
+    return isinstance(value, str) and value != "none"
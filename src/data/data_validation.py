@@ -0,0 +1,308 @@
+"""
+Provides a validation and normalization layer turning batches of raw json data into Talent and Job objects.
+
+In contrast to Talent.create and Job.create, each record is checked completely in a single pass, so that malformed
+input is reported per record up front instead of failing deep inside the feature extraction. Depending on the
+policy, a bad field is either replaced by a default (if there is a sensible one) or the whole record is rejected.
+
+Objects returned by a validator are normalized:
+
+* 'none' is replaced by None
+* languages are managed as a dict with key = 'language title', entries without title or rating are dropped. Entries
+  with an unknown rating are kept (and reported) like in Talent.create and Job.create, the features rate them as 0
+* a job's seniorities are never empty (empty is defaulted to [None], i.e. seniority does not matter)
+* salaries are present, numerical and not negative
+"""
+
+import numbers
+
+from data.data_types import Job
+from data.data_types import Language
+from data.data_types import Talent
+
+LANGUAGE_RATINGS = {"A1", "A2", "B1", "B2", "C1", "C2"}
+SENIORITIES = {"junior", "midlevel", "senior"}
+DEGREES = {"apprenticeship", "bachelor", "master", "doctorate"}
+
+# marks a field error without a sensible default, the record has to be rejected
+NO_DEFAULT = object()
+
+
+class RecordError:
+    """
+    A class representing a problem with one field of one raw record.
+    """
+
+    def __init__(self, index: int, field: str, message: str, defaulted: bool) -> None:
+        """
+        Initialize a new RecordError object.
+
+        :param index: position of the record in the validated batch
+        :param field: name of the affected field
+        :param message: description of the problem
+        :param defaulted: True if the field was replaced by a default, False if the record was rejected
+        """
+        self.index = index
+        self.field = field
+        self.message = message
+        self.defaulted = defaulted
+
+    def __repr__(self):
+        return f"RecordError({self.index},{self.field},{self.message},{self.defaulted})"
+
+
+class ValidationResult:
+    """
+    A class representing the result of validating a batch of raw records.
+    """
+
+    def __init__(self, records: list, indices: list[int], errors: list[RecordError]) -> None:
+        """
+        Initialize a new ValidationResult object.
+
+        :param records: normalized Talent or Job objects of all accepted records
+        :param indices: position of each accepted record in the validated batch
+        :param errors: all problems found, including the ones which have been replaced by a default
+        """
+        self.records = records
+        self.indices = indices
+        self.errors = errors
+
+    @property
+    def rejected(self) -> list[int]:
+        """
+        Positions of the rejected records in the validated batch.
+        :return: sorted list of positions
+        """
+        return sorted({error.index for error in self.errors if not error.defaulted})
+
+    def __repr__(self):
+        return f"ValidationResult({len(self.records)} accepted,{len(self.rejected)} rejected,{self.errors})"
+
+
+class InvalidRecordsError(ValueError):
+    """
+    Raised if raw records had to be rejected.
+    """
+
+    def __init__(self, errors: list[RecordError]) -> None:
+        """
+        Initialize a new InvalidRecordsError.
+        :param errors: errors of the rejected records
+        """
+        self.errors = errors
+        super().__init__(f"{len({error.index for error in errors})} invalid record(s): {errors[:10]}")
+
+
+class FieldError(Exception):
+    """
+    Raised by a field normalizer if a value is invalid.
+    """
+
+    def __init__(self, message: str, default=NO_DEFAULT) -> None:
+        """
+        Initialize a new FieldError.
+        :param message: description of the problem
+        :param default: normalized value to use instead, NO_DEFAULT if there is none
+        """
+        super().__init__(message)
+        self.message = message
+        self.default = default
+
+
+class RecordValidator:
+    """
+    A class representing a validator for one kind of raw record, compiled once from a list of field normalizers.
+    """
+
+    def __init__(self, fields: list[tuple], factory) -> None:
+        """
+        Initialize a new RecordValidator object.
+
+        :param fields: tuples of field name, default if the field is missing (NO_DEFAULT if required) and a normalizer
+            which returns the normalized value or raises a FieldError
+        :param factory: called with the normalized fields as keyword arguments to create the resulting object
+        """
+        self.fields = fields
+        self.factory = factory
+
+    def validate(self, raw_records: list[dict], use_defaults: bool = True) -> ValidationResult:
+        """
+        Validate and normalize a batch of raw records.
+
+        :param raw_records: json-dictionaries as seen in the raw input data
+        :param use_defaults: if True, invalid fields with a sensible default are replaced, else the record is rejected
+        :return: ValidationResult with the normalized objects of all accepted records and all errors found
+        """
+        records = []
+        indices = []
+        errors = []
+        for index, raw_json in enumerate(raw_records):
+            if not isinstance(raw_json, dict):
+                errors.append(RecordError(index, "*", f"expected an object, got {type(raw_json).__name__}", False))
+                continue
+            accepted = True
+            values = {}
+            for name, missing_default, normalize in self.fields:
+                value = raw_json.get(name, None)
+                if value is None:
+                    if missing_default is NO_DEFAULT:
+                        errors.append(RecordError(index, name, "missing", False))
+                        accepted = False
+                    else:
+                        values[name] = missing_default
+                    continue
+                try:
+                    values[name] = normalize(value)
+                except FieldError as error:
+                    defaulted = use_defaults and error.default is not NO_DEFAULT
+                    errors.append(RecordError(index, name, error.message, defaulted))
+                    if defaulted:
+                        values[name] = error.default
+                    else:
+                        accepted = False
+            if accepted:
+                records.append(self.factory(**values))
+                indices.append(index)
+        return ValidationResult(records, indices, errors)
+
+
+def validate_talents(raw_records: list[dict], use_defaults: bool = True) -> ValidationResult:
+    """
+    Validate and normalize a batch of raw json data representing talents.
+
+    :param raw_records: json-dictionaries represent a talent as seen in the raw input data
+    :param use_defaults: if True, invalid fields with a sensible default are replaced, else the record is rejected
+    :return: ValidationResult with Talent objects
+    """
+    return TALENT_VALIDATOR.validate(raw_records, use_defaults)
+
+
+def validate_jobs(raw_records: list[dict], use_defaults: bool = True) -> ValidationResult:
+    """
+    Validate and normalize a batch of raw json data representing jobs.
+
+    :param raw_records: json-dictionaries represent a job as seen in the raw input data
+    :param use_defaults: if True, invalid fields with a sensible default are replaced, else the record is rejected
+    :return: ValidationResult with Job objects
+    """
+    return JOB_VALIDATOR.validate(raw_records, use_defaults)
+
+
+def _languages(with_must_have: bool):
+    """
+    Create a normalizer for a list of languages, dropping (and reporting) entries without title or rating. Entries
+    with a rating other than A1 to C2 are kept as they are, but reported.
+    :param with_must_have: if True, the must_have flag is kept (job), else it is False (talent)
+    :return: normalizer returning languages as dict with key = language title
+    """
+
+    def normalize(value) -> dict[Language]:
+        if not isinstance(value, list):
+            raise FieldError(f"expected a list, got {type(value).__name__}", {})
+        languages = {}
+        invalid = []
+        unknown = []
+        for entry in value:
+            title = entry.get("title", None) if isinstance(entry, dict) else None
+            rating = entry.get("rating", None) if isinstance(entry, dict) else None
+            if not isinstance(title, str) or not isinstance(rating, (str, numbers.Real)):
+                invalid.append(entry)
+                continue
+            if rating not in LANGUAGE_RATINGS:
+                # kept like in Talent.create and Job.create, so that the features are the same as during training
+                unknown.append(entry)
+            must_have = bool(entry.get("must_have", False)) if with_must_have else False
+            languages[title] = Language(title, rating, must_have)
+        if invalid or unknown:
+            problems = ([f"invalid entries {invalid}"] if invalid else []) + \
+                       ([f"unknown ratings in {unknown} (rated as 0)"] if unknown else [])
+            raise FieldError(", ".join(problems), languages)
+        return languages
+
+    return normalize
+
+
+def _job_roles(value) -> list[str]:
+    """
+    Normalize a list of job roles, dropping (and reporting) entries which are not a string.
+    :param value: raw value
+    :return: list of job roles
+    """
+    if not isinstance(value, list):
+        raise FieldError(f"expected a list, got {type(value).__name__}", [])
+    invalid = [role for role in value if not isinstance(role, str)]
+    if invalid:
+        raise FieldError(f"invalid entries {invalid}", [role for role in value if isinstance(role, str)])
+    return value
+
+
+def _level(levels: set[str]):
+    """
+    Create a normalizer for an optional categorical level like seniority or degree.
+    :param levels: known values
+    :return: normalizer returning a known value or None
+    """
+
+    def normalize(value) -> str:
+        if value == "none":
+            return None
+        if not isinstance(value, str) or value not in levels:
+            raise FieldError(f"unknown value {value!r}", None)
+        return value
+
+    return normalize
+
+
+def _seniorities(value) -> list[str]:
+    """
+    Normalize the list of seniorities of a job. None (or 'none') means that seniority does not matter.
+    :param value: raw value
+    :return: non-empty list of known seniorities or None
+    """
+    if not isinstance(value, list):
+        raise FieldError(f"expected a list, got {type(value).__name__}", [None])
+    seniorities = []
+    unknown = []
+    for seniority in value:
+        if seniority is None or seniority == "none":
+            seniorities.append(None)
+        elif isinstance(seniority, str) and seniority in SENIORITIES:
+            seniorities.append(seniority)
+        else:
+            unknown.append(seniority)
+    if unknown:
+        raise FieldError(f"unknown values {unknown}", seniorities or [None])
+    if not seniorities:
+        raise FieldError("empty", [None])
+    return seniorities
+
+
+def _salary(value) -> numbers.Real:
+    """
+    Normalize a salary, which has to be a number and not negative. There is no default.
+    :param value: raw value
+    :return: the salary
+    """
+    if isinstance(value, bool) or not isinstance(value, numbers.Real) or value != value:
+        raise FieldError(f"expected a number, got {value!r}")
+    if value < 0:
+        raise FieldError(f"negative value {value}")
+    return value
+
+
+TALENT_VALIDATOR = RecordValidator([
+    ("languages", {}, _languages(with_must_have=False)),
+    ("job_roles", [], _job_roles),
+    ("seniority", None, _level(SENIORITIES)),
+    ("salary_expectation", NO_DEFAULT, _salary),
+    ("degree", None, _level(DEGREES)),
+], Talent)
+
+JOB_VALIDATOR = RecordValidator([
+    ("languages", {}, _languages(with_must_have=True)),
+    ("job_roles", [], _job_roles),
+    ("seniorities", [None], _seniorities),
+    ("max_salary", NO_DEFAULT, _salary),
+    ("min_degree", None, _level(DEGREES)),
+], Job)
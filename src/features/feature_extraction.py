@@ -12,8 +12,17 @@ Also note:
 * Assignment data set has only 1000 observations per label. So it is very difficult for the machine learning algo
  to learn if we got too many features, so one-hot-encoding is not used.
 
+Besides the per-pair extract_features, every FeatureExtractor offers extract_features_batch. It is split into three
+steps, so that work which only depends on one side is done once per talent or job instead of once per pair:
+
+1. encode_jobs: encode all jobs into numpy arrays (job-only features, vocabularies)
+2. encode_talents: encode all talents into numpy arrays, aligned to the vocabularies of the job encoding
+3. combine: compute the features of the requested (talent, job) pairs into a preallocated matrix
+
 """
 
+import numpy as np
+
 from data.data_types import Job
 from data.data_types import Talent
 
@@ -26,12 +35,38 @@ NUMERICAL_LEVEL_PER_SENIORITY = {"junior": 1, "midlevel": 2, "senior": 3}
 NUMERICAL_LEVEL_PER_DEGREE = {"apprenticeship": 1, "bachelor": 2, "master": 3, "doctorate": 4}
 
 
+def cross_product_pairs(n_talents: int, n_jobs: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Index pairs for all combinations of talents and jobs, ordered talent by talent.
+
+    :param n_talents: number of talents
+    :param n_jobs: number of jobs
+    :return: tuple of talent indices and job indices
+    """
+    return np.repeat(np.arange(n_talents), n_jobs), np.tile(np.arange(n_jobs), n_talents)
+
+
+def aligned_pairs(n: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Index pairs combining the i-th talent with the i-th job, e.g. for labeled training data.
+
+    :param n: number of talents and jobs
+    :return: tuple of talent indices and job indices
+    """
+    index = np.arange(n)
+    return index, index
+
+
 class FeatureExtractor:
     """
     A feature extractor extracts tabular features (columns) from a combination of Talent and Job, hence transforming
     unstructured into tabular data.
     """
 
+    # names of the extracted features, in the order of the columns returned by extract_features_batch. Has to be
+    # declared by each subclass, there is no sensible default
+    feature_names: list[str]
+
     def extract_features(self, talent: Talent, job: Job) -> dict:
         """
         Extract a row with features for the given Talent and Job
@@ -41,6 +76,84 @@ class FeatureExtractor:
         """
         pass
 
+    def encode_jobs(self, jobs: list[Job]):
+        """
+        Encode the given jobs as numpy arrays with one row per job.
+
+        The default implementation keeps the objects and defers all work to combine.
+
+        :param jobs: list of Job objects
+        :return: dictionary with numpy array per encoded property
+        """
+        return {"jobs": _as_object_array(jobs)}
+
+    def encode_talents(self, talents: list[Talent], job_encoding):
+        """
+        Encode the given talents as numpy arrays with one row per talent.
+
+        The default implementation keeps the objects and defers all work to combine.
+
+        :param talents: list of Talent objects
+        :param job_encoding: result of encode_jobs for the jobs the talents will be combined with
+        :return: dictionary with numpy array per encoded property
+        """
+        return {"talents": _as_object_array(talents)}
+
+    def combine(self, talent_encoding, job_encoding, talent_index: np.ndarray, job_index: np.ndarray,
+                out: np.ndarray) -> None:
+        """
+        Calculate the features for the given pairs of encoded talents and jobs.
+
+        The default implementation calls extract_features for each pair.
+
+        :param talent_encoding: result of encode_talents
+        :param job_encoding: result of encode_jobs
+        :param talent_index: row in talent_encoding per pair
+        :param job_index: row in job_encoding per pair
+        :param out: preallocated matrix with one row per pair and one column per feature name to write into
+        :return: None
+        """
+        talents = talent_encoding["talents"]
+        jobs = job_encoding["jobs"]
+        for row, (t, j) in enumerate(zip(talent_index, job_index)):
+            features = self.extract_features(talents[t], jobs[j])
+            out[row] = [features[name] for name in self.feature_names]
+
+    def extract_features_batch(self, talents: list[Talent], jobs: list[Job],
+                               pairs: tuple[np.ndarray, np.ndarray] = None) -> np.ndarray:
+        """
+        Extract a matrix with features for many combinations of talents and jobs.
+
+        The columns are ordered as in feature_names, the values are equal to those of extract_features.
+
+        :param talents: list of Talent objects
+        :param jobs: list of Job objects
+        :param pairs: tuple of talent indices and job indices, one entry per row to extract (e.g. aligned_pairs).
+            If None, all combinations are extracted (see cross_product_pairs).
+        :return: matrix of shape (number of pairs, number of features)
+        """
+        return self.extract_features_encoded(talents, self.encode_jobs(jobs), len(jobs), pairs)
+
+    def extract_features_encoded(self, talents: list[Talent], job_encoding, n_jobs: int,
+                                 pairs: tuple[np.ndarray, np.ndarray] = None) -> np.ndarray:
+        """
+        Extract a matrix with features like extract_features_batch, but for jobs already encoded by encode_jobs.
+
+        :param talents: list of Talent objects
+        :param job_encoding: result of encode_jobs, e.g. loaded from a JobStore
+        :param n_jobs: number of encoded jobs
+        :param pairs: tuple of talent indices and job indices, one entry per row to extract (e.g. aligned_pairs).
+            If None, all combinations are extracted (see cross_product_pairs).
+        :return: matrix of shape (number of pairs, number of features)
+        """
+        if pairs is None:
+            pairs = cross_product_pairs(len(talents), n_jobs)
+        talent_index, job_index = pairs
+        talent_encoding = self.encode_talents(talents, job_encoding)
+        out = np.empty((len(talent_index), len(self.feature_names)), dtype=np.float64)
+        self.combine(talent_encoding, job_encoding, np.asarray(talent_index), np.asarray(job_index), out)
+        return out
+
 
 class FeatureExtractorManager(FeatureExtractor):
     """
@@ -58,12 +171,24 @@ class FeatureExtractorManager(FeatureExtractor):
         self.register(JobRolesFeatureExtractor())
         self.register(LanguageFeatureExtractor())
 
+    @property
+    def feature_names(self) -> list[str]:
+        """
+        Names of all features in order of registration.
+        :return: list of feature names
+        """
+        return [name for extractor in self.extractors for name in extractor.feature_names]
+
     def register(self, extractor: FeatureExtractor) -> None:
         """
         Register the specified extractor.
         :param extractor: Instance of FeatureExtractor to register
         :return: None
+        :raises ValueError: If the extractor does not declare the names of its features
         """
+        if not getattr(extractor, "feature_names", None):
+            # without them, the extractor would add no columns in the batch extraction
+            raise ValueError(f"{type(extractor).__name__} has to declare its feature_names.")
         self.extractors.append(extractor)
 
     def clear(self) -> None:
@@ -88,12 +213,50 @@ class FeatureExtractorManager(FeatureExtractor):
             row.update(feature_extractor.extract_features(talent, job))
         return row
 
+    def encode_jobs(self, jobs: list[Job]) -> list:
+        """
+        Encode the given jobs by calling all registered instances of FeatureExtractor.
+        :param jobs: list of Job objects
+        :return: list with one job encoding per registered extractor
+        """
+        return [extractor.encode_jobs(jobs) for extractor in self.extractors]
+
+    def encode_talents(self, talents: list[Talent], job_encoding: list) -> list:
+        """
+        Encode the given talents by calling all registered instances of FeatureExtractor.
+        :param talents: list of Talent objects
+        :param job_encoding: result of encode_jobs
+        :return: list with one talent encoding per registered extractor
+        """
+        return [extractor.encode_talents(talents, encoding)
+                for extractor, encoding in zip(self.extractors, job_encoding)]
+
+    def combine(self, talent_encoding: list, job_encoding: list, talent_index: np.ndarray, job_index: np.ndarray,
+                out: np.ndarray) -> None:
+        """
+        Calculate the features for the given pairs by letting each registered extractor fill its block of columns.
+
+        :param talent_encoding: result of encode_talents
+        :param job_encoding: result of encode_jobs
+        :param talent_index: row in talent_encoding per pair
+        :param job_index: row in job_encoding per pair
+        :param out: preallocated matrix with one row per pair and one column per feature name to write into
+        :return: None
+        """
+        start = 0
+        for extractor, t_encoding, j_encoding in zip(self.extractors, talent_encoding, job_encoding):
+            end = start + len(extractor.feature_names)
+            extractor.combine(t_encoding, j_encoding, talent_index, job_index, out[:, start:end])
+            start = end
+
 
 class SeniorityFeatureExtractor(FeatureExtractor):
     """
     Class representing an extractor for features about seniority.
     """
 
+    feature_names = ["t_seniority_missing", "t_seniority", "j_min_seniority", "j_max_seniority", "tj_diff_seniority"]
+
     def extract_features(self, talent: Talent, job: Job) -> dict:
         """
         Extract a row with features about seniority matching for the given Talent and Job.
@@ -129,12 +292,63 @@ class SeniorityFeatureExtractor(FeatureExtractor):
             row["tj_diff_seniority"] = row["t_seniority"] - row["j_min_seniority"]
         return row
 
+    def encode_jobs(self, jobs: list[Job]) -> dict:
+        """
+        Encode the minimum and maximum seniority per job.
+        :param jobs: list of Job objects
+        :return: dictionary with numpy array per encoded property
+        """
+        min_seniority = np.empty(len(jobs), dtype=np.int64)
+        max_seniority = np.empty(len(jobs), dtype=np.int64)
+        for index, job in enumerate(jobs):
+            seniority_num_values = [NUMERICAL_LEVEL_PER_SENIORITY.get(job_sen, 0) for job_sen in job.seniorities]
+            min_seniority[index] = min(seniority_num_values)
+            max_seniority[index] = max(seniority_num_values)
+        return {"j_min_seniority": min_seniority, "j_max_seniority": max_seniority}
+
+    def encode_talents(self, talents: list[Talent], job_encoding: dict) -> dict:
+        """
+        Encode the seniority per talent.
+        :param talents: list of Talent objects
+        :param job_encoding: result of encode_jobs
+        :return: dictionary with numpy array per encoded property
+        """
+        return {
+            "t_seniority_missing": np.fromiter((talent.seniority is None for talent in talents), dtype=np.int64,
+                                               count=len(talents)),
+            "t_seniority": np.fromiter((NUMERICAL_LEVEL_PER_SENIORITY.get(talent.seniority, 0) for talent in talents),
+                                       dtype=np.int64, count=len(talents))
+        }
+
+    def combine(self, talent_encoding: dict, job_encoding: dict, talent_index: np.ndarray, job_index: np.ndarray,
+                out: np.ndarray) -> None:
+        """
+        Calculate the seniority features (see extract_features) for the given pairs.
+        :param talent_encoding: result of encode_talents
+        :param job_encoding: result of encode_jobs
+        :param talent_index: row in talent_encoding per pair
+        :param job_index: row in job_encoding per pair
+        :param out: preallocated matrix with one row per pair and one column per feature name to write into
+        :return: None
+        """
+        t_seniority = talent_encoding["t_seniority"][talent_index]
+        j_min_seniority = job_encoding["j_min_seniority"][job_index]
+        j_max_seniority = job_encoding["j_max_seniority"][job_index]
+        out[:, 0] = talent_encoding["t_seniority_missing"][talent_index]
+        out[:, 1] = t_seniority
+        out[:, 2] = j_min_seniority
+        out[:, 3] = j_max_seniority
+        match = (j_min_seniority <= t_seniority) & (t_seniority <= j_max_seniority)
+        out[:, 4] = np.where(match, 0, t_seniority - j_min_seniority)
+
 
 class DegreeFeatureExtractor(FeatureExtractor):
     """
     Class representing an extractor for features about degree.
     """
 
+    feature_names = ["t_degree", "j_degree", "tj_diff_degree"]
+
     def extract_features(self, talent: Talent, job: Job) -> dict:
         """
         Extract a row with features about degree matching for the given Talent and Job.
@@ -157,12 +371,50 @@ class DegreeFeatureExtractor(FeatureExtractor):
 
         return row
 
+    def encode_jobs(self, jobs: list[Job]) -> dict:
+        """
+        Encode the minimum degree per job.
+        :param jobs: list of Job objects
+        :return: dictionary with numpy array per encoded property
+        """
+        return {"j_degree": np.fromiter((NUMERICAL_LEVEL_PER_DEGREE.get(job.min_degree, 0) for job in jobs),
+                                        dtype=np.int64, count=len(jobs))}
+
+    def encode_talents(self, talents: list[Talent], job_encoding: dict) -> dict:
+        """
+        Encode the degree per talent.
+        :param talents: list of Talent objects
+        :param job_encoding: result of encode_jobs
+        :return: dictionary with numpy array per encoded property
+        """
+        return {"t_degree": np.fromiter((NUMERICAL_LEVEL_PER_DEGREE.get(talent.degree, 0) for talent in talents),
+                                        dtype=np.int64, count=len(talents))}
+
+    def combine(self, talent_encoding: dict, job_encoding: dict, talent_index: np.ndarray, job_index: np.ndarray,
+                out: np.ndarray) -> None:
+        """
+        Calculate the degree features (see extract_features) for the given pairs.
+        :param talent_encoding: result of encode_talents
+        :param job_encoding: result of encode_jobs
+        :param talent_index: row in talent_encoding per pair
+        :param job_index: row in job_encoding per pair
+        :param out: preallocated matrix with one row per pair and one column per feature name to write into
+        :return: None
+        """
+        t_degree = talent_encoding["t_degree"][talent_index]
+        j_degree = job_encoding["j_degree"][job_index]
+        out[:, 0] = t_degree
+        out[:, 1] = j_degree
+        out[:, 2] = t_degree - j_degree
+
 
 class SalaryFeatureExtractor(FeatureExtractor):
     """
     Class representing an extractor for features about salary.
     """
 
+    feature_names = ["tf_salary_diff"]
+
     def extract_features(self, talent: Talent, job: Job) -> dict:
         """
         Extract a row with features about salary matching for the given Talent and Job.
@@ -180,12 +432,45 @@ class SalaryFeatureExtractor(FeatureExtractor):
         row = {"tf_salary_diff": (job.max_salary - talent.salary_expectation + 1) / (job.max_salary + 1)}
         return row
 
+    def encode_jobs(self, jobs: list[Job]) -> dict:
+        """
+        Encode the max salary per job. A missing salary is encoded as NaN.
+        :param jobs: list of Job objects
+        :return: dictionary with numpy array per encoded property
+        """
+        return {"j_max_salary": np.array([job.max_salary for job in jobs], dtype=np.float64)}
+
+    def encode_talents(self, talents: list[Talent], job_encoding: dict) -> dict:
+        """
+        Encode the salary expectation per talent. A missing salary is encoded as NaN.
+        :param talents: list of Talent objects
+        :param job_encoding: result of encode_jobs
+        :return: dictionary with numpy array per encoded property
+        """
+        return {"t_salary_expectation": np.array([talent.salary_expectation for talent in talents], dtype=np.float64)}
+
+    def combine(self, talent_encoding: dict, job_encoding: dict, talent_index: np.ndarray, job_index: np.ndarray,
+                out: np.ndarray) -> None:
+        """
+        Calculate the salary features (see extract_features) for the given pairs.
+        :param talent_encoding: result of encode_talents
+        :param job_encoding: result of encode_jobs
+        :param talent_index: row in talent_encoding per pair
+        :param job_index: row in job_encoding per pair
+        :param out: preallocated matrix with one row per pair and one column per feature name to write into
+        :return: None
+        """
+        j_max_salary = job_encoding["j_max_salary"][job_index]
+        out[:, 0] = (j_max_salary - talent_encoding["t_salary_expectation"][talent_index] + 1) / (j_max_salary + 1)
+
 
 class JobRolesFeatureExtractor(FeatureExtractor):
     """
     Class representing an extractor for features about job roles.
     """
 
+    feature_names = ["tf_role_match"]
+
     def extract_features(self, talent: Talent, job: Job) -> dict:
         """
         Extract a row with features about job roles matching for the given Talent and Job.
@@ -210,12 +495,54 @@ class JobRolesFeatureExtractor(FeatureExtractor):
         row["tf_role_match"] = match
         return row
 
+    def encode_jobs(self, jobs: list[Job]) -> dict:
+        """
+        Encode the job roles per job as bit set over the vocabulary of all roles of the given jobs.
+        :param jobs: list of Job objects
+        :return: dictionary with numpy array per encoded property
+        """
+        vocabulary = {}
+        for job in jobs:
+            for role in job.job_roles:
+                vocabulary.setdefault(role, len(vocabulary))
+        return {"roles": np.array(list(vocabulary), dtype=str),
+                "j_roles": _encode_bit_sets([job.job_roles for job in jobs], vocabulary)}
+
+    def encode_talents(self, talents: list[Talent], job_encoding: dict) -> dict:
+        """
+        Encode the desired roles per talent as bit set over the vocabulary of the job encoding.
+
+        Roles that no job offers can never match and are hence dropped.
+
+        :param talents: list of Talent objects
+        :param job_encoding: result of encode_jobs
+        :return: dictionary with numpy array per encoded property
+        """
+        vocabulary = {role: index for index, role in enumerate(job_encoding["roles"].tolist())}
+        return {"t_roles": _encode_bit_sets([talent.job_roles for talent in talents], vocabulary)}
+
+    def combine(self, talent_encoding: dict, job_encoding: dict, talent_index: np.ndarray, job_index: np.ndarray,
+                out: np.ndarray) -> None:
+        """
+        Calculate the job role features (see extract_features) for the given pairs.
+        :param talent_encoding: result of encode_talents
+        :param job_encoding: result of encode_jobs
+        :param talent_index: row in talent_encoding per pair
+        :param job_index: row in job_encoding per pair
+        :param out: preallocated matrix with one row per pair and one column per feature name to write into
+        :return: None
+        """
+        common_roles = talent_encoding["t_roles"][talent_index] & job_encoding["j_roles"][job_index]
+        out[:, 0] = common_roles.any(axis=1)
+
 
 class LanguageFeatureExtractor(FeatureExtractor):
     """
     Class representing an extractor for features about languages and their ratings.
     """
 
+    feature_names = ["j_lang_importance", "tj_lang_avg_diff"]
+
     def extract_features(self, talent: Talent, job: Job) -> dict:
         """
         Extract a row with features about language (rating) matching for the given Talent and Job.
@@ -249,3 +576,87 @@ class LanguageFeatureExtractor(FeatureExtractor):
         row = {"j_lang_importance": sum_lang_importance,
                "tj_lang_avg_diff": sum_lang_diff / sum_lang_importance if sum_lang_importance > 0 else 0}
         return row
+
+    def encode_jobs(self, jobs: list[Job]) -> dict:
+        """
+        Encode the must-have languages per job as rating vector over the vocabulary of all must-have languages.
+        :param jobs: list of Job objects
+        :return: dictionary with numpy array per encoded property
+        """
+        vocabulary = {}
+        for job in jobs:
+            for job_language in job.languages.values():
+                if job_language.must_have:
+                    vocabulary.setdefault(job_language.title, len(vocabulary))
+
+        must_have = np.zeros((len(jobs), len(vocabulary)), dtype=bool)
+        rating = np.zeros((len(jobs), len(vocabulary)), dtype=np.int64)
+        for index, job in enumerate(jobs):
+            for job_language in job.languages.values():
+                if job_language.must_have:
+                    column = vocabulary[job_language.title]
+                    must_have[index, column] = True
+                    rating[index, column] = NUMERICAL_LEVEL_PER_LANGUAGE_RATING.get(job_language.rating, 0)
+        return {"languages": np.array(list(vocabulary), dtype=str), "j_lang_must_have": must_have,
+                "j_lang_rating": rating, "j_lang_importance": must_have.sum(axis=1)}
+
+    def encode_talents(self, talents: list[Talent], job_encoding: dict) -> dict:
+        """
+        Encode the language skills per talent as rating vector over the vocabulary of the job encoding.
+        :param talents: list of Talent objects
+        :param job_encoding: result of encode_jobs
+        :return: dictionary with numpy array per encoded property
+        """
+        languages = job_encoding["languages"].tolist()
+        rating = np.zeros((len(talents), len(languages)), dtype=np.int64)
+        for index, talent in enumerate(talents):
+            for column, title in enumerate(languages):
+                talent_language = talent.languages.get(title, None)
+                if talent_language is not None:
+                    rating[index, column] = NUMERICAL_LEVEL_PER_LANGUAGE_RATING.get(talent_language.rating, 0)
+        return {"t_lang_rating": rating}
+
+    def combine(self, talent_encoding: dict, job_encoding: dict, talent_index: np.ndarray, job_index: np.ndarray,
+                out: np.ndarray) -> None:
+        """
+        Calculate the language features (see extract_features) for the given pairs.
+        :param talent_encoding: result of encode_talents
+        :param job_encoding: result of encode_jobs
+        :param talent_index: row in talent_encoding per pair
+        :param job_index: row in job_encoding per pair
+        :param out: preallocated matrix with one row per pair and one column per feature name to write into
+        :return: None
+        """
+        importance = job_encoding["j_lang_importance"][job_index]
+        rating_diff = talent_encoding["t_lang_rating"][talent_index] - job_encoding["j_lang_rating"][job_index]
+        sum_lang_diff = np.where(job_encoding["j_lang_must_have"][job_index], rating_diff, 0).sum(axis=1)
+        out[:, 0] = importance
+        out[:, 1] = 0
+        np.divide(sum_lang_diff, importance, out=out[:, 1], where=importance > 0)
+
+
+def _as_object_array(items: list) -> np.ndarray:
+    """
+    Wrap arbitrary objects into a one-dimensional numpy array without numpy looking into them.
+    :param items: list of objects
+    :return: numpy array of dtype object
+    """
+    array = np.empty(len(items), dtype=object)
+    array[:] = items
+    return array
+
+
+def _encode_bit_sets(lists_of_values: list[list[str]], vocabulary: dict) -> np.ndarray:
+    """
+    Encode each list of values as bit set over the given vocabulary, values outside the vocabulary are dropped.
+    :param lists_of_values: one list of values per row
+    :param vocabulary: column per value
+    :return: packed bit matrix with one row per list (see numpy.packbits)
+    """
+    bits = np.zeros((len(lists_of_values), len(vocabulary)), dtype=bool)
+    for index, values in enumerate(lists_of_values):
+        for value in values:
+            column = vocabulary.get(value, None)
+            if column is not None:
+                bits[index, column] = True
+    return np.packbits(bits, axis=1)
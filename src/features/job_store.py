@@ -0,0 +1,203 @@
+"""
+Provides a persistent store of jobs encoded for the feature extraction (see FeatureExtractor.encode_jobs).
+
+Job-only features do not depend on the talent, so they are computed once when the store is built. A store is a
+directory with
+
+* one numpy file per array of the job encoding, memory-mapped when the store is loaded
+* ids.npy: the id per job, i.e. the id map
+* jobs.jsonl and offsets.npy: the validated raw json per job, read lazily for the jobs actually displayed
+* manifest.json: extractors and feature names the encoding has been built with
+
+Build a store from a JSON or JSON-lines feed of jobs (run from the src directory):
+
+    python -m features.job_store path/to/jobs.jsonl path/to/store
+
+Each job may contain an 'id', else its position in the feed is used.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from data.data_validation import validate_jobs
+from features.feature_extraction import FeatureExtractorManager
+
+MANIFEST_FILE_NAME = "manifest.json"
+IDS_FILE_NAME = "ids.npy"
+RAW_JOBS_FILE_NAME = "jobs.jsonl"
+OFFSETS_FILE_NAME = "offsets.npy"
+
+
+def read_json_records(path: str) -> list[dict]:
+    """
+    Reads records from a file with either a JSON array or one JSON object per line (JSON lines).
+    :param path: path of the file
+    :return: list of records
+    :raises OSError: if e.g. the file is not there
+    """
+    try:
+        with open(path) as file:
+            first = file.read(1)
+            while first.isspace():
+                first = file.read(1)
+            file.seek(0)
+            if first == "[":
+                records = json.load(file)
+            else:
+                records = [json.loads(line) for line in file if line.strip()]
+    except OSError:
+        print(f"Failed to read records from {path}")
+        raise
+    else:
+        print(f"Successfully read {len(records)} records from {path}")
+    return records
+
+
+class JobStore:
+    """
+    A class representing a loaded store of encoded jobs.
+    """
+
+    def __init__(self, path: str, ids: np.ndarray, job_encoding: list, offsets: np.ndarray) -> None:
+        """
+        Initialize an object of JobStore. Use load to open an existing store.
+
+        :param path: directory of the store
+        :param ids: id per job
+        :param job_encoding: jobs encoded by FeatureExtractorManager.encode_jobs
+        :param offsets: position of the raw json per job in the raw jobs file
+        """
+        self.path = path
+        self.ids = ids
+        self.job_encoding = job_encoding
+        self.offsets = offsets
+        self.row_per_id = {job_id: row for row, job_id in enumerate(ids.tolist())}
+
+    @classmethod
+    def load(cls, path: str, feature_extractor: FeatureExtractorManager = None) -> "JobStore":
+        """
+        Load a store, the encoded arrays are memory-mapped.
+
+        :param path: directory of the store
+        :param feature_extractor: the extractor the encoding will be used with, by default FeatureExtractorManager()
+        :return: the loaded JobStore
+        :raises OSError: if e.g. the store is not there
+        :raises ValueError: if the store has been built with other extractors or features
+        """
+        feature_extractor = feature_extractor or FeatureExtractorManager()
+        try:
+            with open(os.path.join(path, MANIFEST_FILE_NAME)) as file:
+                manifest = json.load(file)
+            if manifest["extractors"] != _extractor_names(feature_extractor) or \
+                    manifest["feature_names"] != feature_extractor.feature_names:
+                raise ValueError(f"Job store {path} has been built for other features, please rebuild it.")
+            job_encoding = [{key: np.load(os.path.join(path, file_name), mmap_mode="r")
+                             for key, file_name in arrays.items()} for arrays in manifest["arrays"]]
+            ids = np.load(os.path.join(path, IDS_FILE_NAME))
+            offsets = np.load(os.path.join(path, OFFSETS_FILE_NAME), mmap_mode="r")
+        except OSError:
+            print(f"Failed to load job store from {path}. Maybe it has not been built yet.")
+            raise
+        else:
+            print(f"Successfully loaded job store with {len(ids)} jobs from {path}")
+        return cls(path, ids, job_encoding, offsets)
+
+    def rows(self, job_ids: list) -> np.ndarray:
+        """
+        Look up the rows of the given job ids.
+        :param job_ids: ids of jobs in the store
+        :return: row per job id
+        :raises KeyError: if a job id is not in the store
+        """
+        return np.array([self.row_per_id[str(job_id)] for job_id in job_ids], dtype=np.int64)
+
+    def raw_jobs(self, rows) -> list[dict]:
+        """
+        Read the raw json of the given jobs.
+        :param rows: rows of the jobs in the store
+        :return: list of json-dictionaries, one per row
+        """
+        jobs = []
+        with open(os.path.join(self.path, RAW_JOBS_FILE_NAME)) as file:
+            for row in np.atleast_1d(rows).tolist():
+                file.seek(int(self.offsets[row]))
+                jobs.append(json.loads(file.readline()))
+        return jobs
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __repr__(self) -> str:
+        return f"JobStore({self.path},{len(self.ids)} jobs)"
+
+
+def build_job_store(feed_path: str, path: str, feature_extractor: FeatureExtractorManager = None) -> JobStore:
+    """
+    Builds a store from a feed of raw jobs. Invalid jobs are normalized or skipped (see data_validation).
+
+    :param feed_path: file with raw jobs as JSON array or JSON lines
+    :param path: directory of the store, existing files are overwritten
+    :param feature_extractor: the extractor to encode the jobs with, by default FeatureExtractorManager()
+    :return: the built JobStore, loaded from disk
+    :raises OSError: if something went wrong during reading or writing
+    :raises ValueError: if a registered extractor does not encode jobs as numerical arrays
+    """
+    feature_extractor = feature_extractor or FeatureExtractorManager()
+    start_time = time.time()
+    records = read_json_records(feed_path)
+    validation = validate_jobs(records)
+    for error in validation.errors:
+        print(f"Invalid job {error.index}: {error.field} {error.message} "
+              f"({'replaced by default' if error.defaulted else 'skipped'})")
+
+    job_encoding = feature_extractor.encode_jobs(validation.records)
+    ids = np.array([str(records[index].get("id", index)) for index in validation.indices], dtype=str)
+    if len(set(ids.tolist())) != len(ids):
+        raise ValueError("Job ids in the feed are not unique.")
+
+    os.makedirs(path, exist_ok=True)
+    manifest_arrays = []
+    for position, encoding in enumerate(job_encoding):
+        arrays = {}
+        for key, array in encoding.items():
+            file_name = f"{position}.{key}.npy"
+            # allow_pickle=False, since object arrays can't be memory-mapped
+            np.save(os.path.join(path, file_name), array, allow_pickle=False)
+            arrays[key] = file_name
+        manifest_arrays.append(arrays)
+    np.save(os.path.join(path, IDS_FILE_NAME), ids)
+
+    offsets = np.empty(len(validation.indices), dtype=np.int64)
+    with open(os.path.join(path, RAW_JOBS_FILE_NAME), "w") as file:
+        for row, index in enumerate(validation.indices):
+            offsets[row] = file.tell()
+            file.write(json.dumps(records[index]) + "\n")
+    np.save(os.path.join(path, OFFSETS_FILE_NAME), offsets)
+
+    with open(os.path.join(path, MANIFEST_FILE_NAME), "w") as file:
+        json.dump({"extractors": _extractor_names(feature_extractor), "feature_names": feature_extractor.feature_names,
+                   "arrays": manifest_arrays}, file, indent=2)
+    print(f"Successfully built job store with {len(ids)} jobs in {path}, "
+          f"took ~ {round(time.time() - start_time)} seconds.")
+    return JobStore.load(path, feature_extractor)
+
+
+def _extractor_names(feature_extractor: FeatureExtractorManager) -> list[str]:
+    """
+    Names of the registered extractors, to check the compatibility of a store.
+    :param feature_extractor: the extractor manager
+    :return: list of class names
+    """
+    return [type(extractor).__name__ for extractor in feature_extractor.extractors]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a store of encoded jobs from a JSON or JSON-lines feed.")
+    parser.add_argument("feed", help="file with raw jobs, either a JSON array or JSON lines")
+    parser.add_argument("store", help="directory of the job store to (re)build")
+    arguments = parser.parse_args()
+    build_job_store(arguments.feed, arguments.store)
@@ -2,20 +2,40 @@
 Provides methods to train, load and access a Model to make match predictions.
 """
 
+import hashlib
 import importlib.resources as resources
+import json
+import os
 import time
+import tracemalloc
 
+import numpy as np
 import pandas as pd
 import skops.io as sio
+from scipy import sparse
 from sklearn.base import BaseEstimator
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import cross_val_score
-
-from data.data_io import read_and_prepare_raw_data
+from sklearn.isotonic import IsotonicRegression
+from sklearn.model_selection import cross_validate
+
+from data.data_io import fingerprint_raw_data_before
+from data.data_io import locate_raw_data_end
+from data.data_io import memory_map_data_frame_from_resources
+from data.data_io import prepare_raw_data
+from data.data_io import read_data_frame_from_resources
+from data.data_io import read_raw_data
+from data.data_io import read_raw_data_from
+from data.data_io import resource_size
+from data.data_io import truncate_resource
 from data.data_io import write_data_frame_to_resources
-from data.data_types import Job
 from data.data_types import Talent
+from data.data_validation import InvalidRecordsError
+from data.data_validation import ValidationResult
+from data.data_validation import validate_jobs
+from data.data_validation import validate_talents
 from features.feature_extraction import FeatureExtractorManager
+from features.feature_extraction import aligned_pairs
+from features.feature_extraction import cross_product_pairs
 
 
 class Model:
@@ -23,98 +43,390 @@ class Model:
     An interface to access a trained model
     """
 
-    def predict(self, talent_raw: dict, job_raw: dict) -> dict:
+    def predict(self, talent_raw: dict, job_raw: dict, explain: bool = False) -> dict:
         """
         Predicts a label and confidence for the combination of job and talent, each represented by raw json input data
         :param self: the model object
         :param talent_raw: json-dictionary represent a talent as seen in the raw input data
         :param job_raw: json-dictionary represent a job as seen in the raw input data
+        :param explain: if True, an 'explanation' with per-feature contributions to the score is added
         :return: dict with talent and job (unchanged) along with label and score / confidence
         """
         pass
 
-    def predict_bulk(self, talents_raw: list[dict], jobs_raw: list[dict]) -> list[dict]:
+    def predict_bulk(self, talents_raw: list[dict], jobs_raw: list[dict], explain: bool = False) -> list[dict]:
         """
         Predicts a label and confidence for each combination of job and talent, each represented by raw json input data
         :param self: the model object
         :param talents_raw: list of json-dictionaries represent a talent as seen in the raw input data
         :param jobs_raw: list of json-dictionaries represent a job as seen in the raw input data
+        :param explain: if True, an 'explanation' with per-feature contributions to the score is added
         :return: list of dictionaries with talent and job (unchanged) along with label and score
         """
         pass
 
+    def predict_bulk_compact(self, talents_raw: list[dict], jobs_raw: list[dict], explain: bool = False) -> np.ndarray:
+        """
+        Predicts a label and confidence for each combination of job and talent, each represented by raw json input data
+        :param self: the model object
+        :param talents_raw: list of json-dictionaries represent a talent as seen in the raw input data
+        :param jobs_raw: list of json-dictionaries represent a job as seen in the raw input data
+        :param explain: if True, fields 'bias' and 'contributions' are added
+        :return: structured array with talent_index, job_index, label and score (see materialize_results)
+        """
+        pass
+
 
 class MysticMeritModel(Model):
     """
     Simple implementation of Model including data preprocessing before prediction.
     """
 
-    def __init__(self, classifier: BaseEstimator) -> None:
+    def __init__(self, classifier: BaseEstimator, version: str = None,
+                 calibration: tuple[np.ndarray, np.ndarray] = None) -> None:
         """
         Initialize an object of MysticMeritModel.
         :param classifer: binary classifier trained on tabular data to use internally
+        :param version: identifies the trained classifier, e.g. to invalidate cached scores
+        :param calibration: optional points of the calibration function (see fit_calibration), if None the vote share
+            of the positive class is used as probability
         """
         self.classifier = classifier
-        pass
+        self.version = version
+        self.calibration = calibration
+        self.feature_extractor = FeatureExtractorManager()
+        # lazily created by explain_features
+        self.path_decomposition = None
 
-    def predict(self, talent_raw: dict, job_raw: dict) -> dict:
+    def predict(self, talent_raw: dict, job_raw: dict, explain: bool = False) -> dict:
         """
         Predicts a label and confidence for the combination of job and talent, each represented by raw json input data.
 
-        The resulting list of dictionaries is sorted by score in descending order.
-
         :param self: the model object
         :param talent_raw: json-dictionary represent a talent as seen in the raw input data
         :param job_raw: json-dictionary represent a job as seen in the raw input data
-        :return: dict with talent and job (unchanged) along with label and score
+        :param explain: if True, an 'explanation' with per-feature contributions to the score is added
+        :return: dict with talent and job (unchanged) along with label, score and probability
+        :raises InvalidRecordsError: if talent or job is malformed (e.g. a missing salary)
         """
-        talent = Talent.create(talent_raw)
-        job = Job.create(job_raw)
+        return self.predict_bulk([talent_raw], [job_raw], explain)[0]
 
-        feature_extractor = FeatureExtractorManager()
-        df_app = pd.DataFrame([feature_extractor.extract_features(talent, job)])
+    def predict_bulk(self, talents_raw: list[dict], jobs_raw: list[dict], explain: bool = False) -> list[dict]:
+        """
+        Predicts a label and confidence for each combination of job and talent, each represented by raw json input data.
 
-        # predict_proba is not defined in BaseEstimator ... example of duck typing approach in scikit-learn
-        predict_prob = self.classifier.predict_proba(df_app)[0]
-        classes = self.classifier.classes_
-        confidence_per_class = {classes[index]: predict_prob[index] for index in range(0, len(classes))}
-
-        prediction = self.classifier.predict(df_app)[0]
-        confidence = confidence_per_class.get(prediction)
-
-        return {
-            "talent": talent_raw,
-            "job": job_raw,
-            "label": prediction,
-            "score": confidence
-        }
+        The resulting list of dictionaries is sorted by score in descending order.
+
+        :param self: the model object
+        :param talents_raw: list of json-dictionaries represent a talent as seen in the raw input data
+        :param jobs_raw: list of json-dictionaries represent a job as seen in the raw input data
+        :param explain: if True, an 'explanation' with per-feature contributions to the score is added
+        :return: list of dictionaries with talent and job (unchanged) along with label, score and probability
+        """
+        return materialize_results(self.predict_bulk_compact(talents_raw, jobs_raw, explain), talents_raw, jobs_raw)
 
-    def predict_bulk(self, talents_raw: list[dict], jobs_raw: list[dict]) -> list[dict]:
+    def predict_bulk_compact(self, talents_raw: list[dict], jobs_raw: list[dict], explain: bool = False) -> np.ndarray:
         """
         Predicts a label and confidence for each combination of job and talent, each represented by raw json input data.
 
-        The resulting list of dictionaries is sorted by score in descending order.
+        Instead of echoing the raw json per combination, the result only references talents and jobs by their index in
+        the input lists. It is sorted by score in descending order, use materialize_results to get the dictionaries
+        of predict_bulk for the rows actually needed.
 
         :param self: the model object
         :param talents_raw: list of json-dictionaries represent a talent as seen in the raw input data
         :param jobs_raw: list of json-dictionaries represent a job as seen in the raw input data
-        :return: list of dictionaries with talent and job (unchanged) along with label and score
+        :param explain: if True, fields 'bias' and 'contributions' are added (see explain_features)
+        :return: structured array with fields talent_index, job_index, label, score and probability
+        :raises InvalidRecordsError: if a talent or job is malformed (e.g. a missing salary), before anything is scored
+        """
+        talent_index, job_index = cross_product_pairs(len(talents_raw), len(jobs_raw))
+        prediction = self.predict_pairs(talents_raw, jobs_raw, (talent_index, job_index), explain)
+        return compact_result(talent_index, job_index, *prediction,
+                              feature_names=self.feature_extractor.feature_names if explain else None)
+
+    def predict_pairs(self, talents_raw: list[dict], jobs_raw: list[dict], pairs: tuple[np.ndarray, np.ndarray],
+                      explain: bool = False) -> tuple[np.ndarray, ...]:
+        """
+        Predicts a label and confidence for selected combinations of job and talent.
+
+        :param talents_raw: list of json-dictionaries represent a talent as seen in the raw input data
+        :param jobs_raw: list of json-dictionaries represent a job as seen in the raw input data
+        :param pairs: tuple of talent indices and job indices, one entry per combination to predict
+        :param explain: if True, predict with explain_features instead of predict_features
+        :return: tuple of predicted labels, the confidence in these labels and the calibrated probability of the
+            positive class, one entry per combination. If explain is True, followed by bias and contributions (see
+            explain_features)
+        :raises InvalidRecordsError: if a talent or job is malformed (e.g. a missing salary), before anything is scored
+        """
+        jobs = _accepted_records(validate_jobs(jobs_raw))
+        return self.predict_pairs_encoded(talents_raw, self.feature_extractor.encode_jobs(jobs), len(jobs), pairs,
+                                          explain)
+
+    def predict_pairs_encoded(self, talents_raw: list[dict], job_encoding: list, n_jobs: int,
+                              pairs: tuple[np.ndarray, np.ndarray] = None,
+                              explain: bool = False) -> tuple[np.ndarray, ...]:
+        """
+        Predicts a label and confidence for combinations of talents and already encoded jobs (e.g. from a JobStore).
+
+        :param talents_raw: list of json-dictionaries represent a talent as seen in the raw input data
+        :param job_encoding: jobs encoded by FeatureExtractorManager.encode_jobs
+        :param n_jobs: number of encoded jobs
+        :param pairs: tuple of talent indices and job indices, one entry per combination to predict. If None, all
+            combinations are predicted (see cross_product_pairs)
+        :param explain: if True, predict with explain_features instead of predict_features
+        :return: see predict_pairs
+        :raises InvalidRecordsError: if a talent is malformed (e.g. a missing salary), before anything is scored
+        """
+        talents = _accepted_records(validate_talents(talents_raw))
+        return self.predict_validated_pairs(talents, job_encoding, n_jobs, pairs, explain)
+
+    def predict_validated_pairs(self, talents: list[Talent], job_encoding: list, n_jobs: int,
+                                pairs: tuple[np.ndarray, np.ndarray] = None,
+                                explain: bool = False) -> tuple[np.ndarray, ...]:
+        """
+        Like predict_pairs_encoded, but for talents which have already been validated (see data_validation), e.g. by
+        a caller reporting invalid records itself. They are not checked again.
+
+        :param talents: normalized Talent objects as returned by validate_talents
+        :param job_encoding: jobs encoded by FeatureExtractorManager.encode_jobs
+        :param n_jobs: number of encoded jobs
+        :param pairs: tuple of talent indices and job indices, see predict_pairs_encoded
+        :param explain: if True, predict with explain_features instead of predict_features
+        :return: see predict_pairs
+        """
+        features = self.feature_extractor.extract_features_encoded(talents, job_encoding, n_jobs, pairs)
+        return self.explain_features(features) if explain else self.predict_features(features)
+
+    def predict_features(self, features: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Predicts a label and confidence for each row of an already extracted feature matrix.
+
+        :param features: matrix as returned by FeatureExtractorManager.extract_features_batch
+        :return: tuple of predicted labels, the confidence in these labels and the calibrated probability of the
+            positive class (see calibrate)
+        """
+        if features.shape[0] == 0:
+            # scikit-learn refuses to predict for zero rows
+            return self.classifier.classes_[:0], np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64)
+        # predict_proba is not defined in BaseEstimator ... example of duck typing approach in scikit-learn
+        predict_prob = self.classifier.predict_proba(
+            pd.DataFrame(features, columns=self.feature_extractor.feature_names, copy=False))
+        # equal to classifier.predict, but without a second pass through the classifier
+        best = predict_prob.argmax(axis=1)
+        return self.classifier.classes_[best], predict_prob[np.arange(len(best)), best], \
+            self.calibrate(predict_prob[:, -1])
+
+    def calibrate(self, positive_shares: np.ndarray) -> np.ndarray:
+        """
+        Maps the vote share of the positive class (the last of the classifier's classes, i.e. True) to a calibrated
+        probability. The calibration function is piecewise linear, so this is a single vectorized interpolation.
+
+        :param positive_shares: vote share of the positive class per combination
+        :return: calibrated probability of the positive class per combination, the vote share if there is no
+            calibration
         """
-        result = []
-        for talent_raw in talents_raw:
-            for job_raw in jobs_raw:
-                result.append(self.predict(talent_raw, job_raw))
+        if self.calibration is None:
+            return np.asarray(positive_shares, dtype=np.float64)
+        thresholds, probabilities = self.calibration
+        return np.interp(positive_shares, thresholds, probabilities)
 
-        return sorted(result, key=lambda entry: entry["score"], reverse=True)
+    def positive_shares(self, labels: np.ndarray, scores: np.ndarray) -> np.ndarray:
+        """
+        Recovers the vote share of the positive class from predicted labels and the confidence in them, e.g. for
+        cached predictions. Only valid for binary classifiers.
+
+        :param labels: predicted label per combination
+        :param scores: confidence in the predicted label per combination
+        :return: vote share of the positive class per combination
+        """
+        return np.where(labels == self.classifier.classes_[-1], scores, 1 - scores)
+
+    def explain_features(self, features: np.ndarray) -> tuple[np.ndarray, ...]:
+        """
+        Predicts a label and confidence for each row of an already extracted feature matrix along with the
+        contribution of each feature to the confidence.
+
+        Contributions are calculated by decomposing the decision path in each tree: Each split moves the predicted
+        class share from the share at the parent node to the one at the child node, this change is attributed to the
+        feature used by the split. Summed over the path, this equals the share at the leaf minus the one at the root
+        (the bias). The decision paths of all trees are determined in one vectorized pass, which also yields the
+        confidence itself (equal to the one of predict_features). Bias plus contributions equal the confidence up to
+        rounding.
+
+        Only supported for forests of decision trees, e.g. RandomForestClassifier.
+
+        :param features: matrix as returned by FeatureExtractorManager.extract_features_batch
+        :return: tuple of predicted labels, the confidence in these labels, the calibrated probability of the
+            positive class, the bias per row and the contribution per row and feature (in order of feature_names).
+            Bias and contributions are with respect to the predicted label
+        """
+        n_features = features.shape[1]
+        n_classes = len(self.classifier.classes_)
+        if features.shape[0] == 0:
+            # scikit-learn refuses to predict for zero rows
+            return (self.classifier.classes_[:0], np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64),
+                    np.empty(0, dtype=np.float64), np.empty((0, n_features), dtype=np.float64))
+        if self.path_decomposition is None:
+            self.path_decomposition = _decompose_tree_paths(self.classifier.estimators_, n_features, n_classes)
+        node_values, bias = self.path_decomposition
+
+        node_indicator, _ = self.classifier.decision_path(
+            pd.DataFrame(features, columns=self.feature_extractor.feature_names, copy=False))
+        values = (node_indicator @ node_values).toarray()
+        contributions = values[:, :n_features * n_classes].reshape(-1, n_features, n_classes)
+        # summing the leaves of all trees, then dividing, exactly as predict_proba of the forest does
+        predict_prob = values[:, n_features * n_classes:] / len(self.classifier.estimators_)
+        best = predict_prob.argmax(axis=1)
+        rows = np.arange(len(best))
+        return (self.classifier.classes_[best], predict_prob[rows, best], self.calibrate(predict_prob[:, -1]),
+                bias[best], contributions[rows, :, best])
 
     def __repr__(self) -> str:
         return f"MysticMeritModel({self.classifier.__repr__()})"
 
 
+def _decompose_tree_paths(estimators: list, n_features: int, n_classes: int) -> tuple[sparse.csr_matrix, np.ndarray]:
+    """
+    Precomputes the per-node values for the decision path decomposition (see explain_features).
+    :param estimators: fitted decision trees of a forest, in order of the forest
+    :param n_features: number of features
+    :param n_classes: number of classes
+    :return: tuple of sparse matrix and the bias per class averaged over the trees. The matrix has one row per node of
+        all trees (as in decision_path of the forest). It has one column per feature and class holding the contribution
+        averaged over the trees, followed by one column per class holding the class share at leaf nodes.
+    """
+    rows, columns, values = [], [], []
+    bias = np.zeros(n_classes)
+    offset = 0
+    for estimator in estimators:
+        tree = estimator.tree_
+        # class shares per node, independent of whether the tree stores counts or fractions
+        share = tree.value[:, 0, :] / tree.value[:, 0, :].sum(axis=1, keepdims=True)
+        bias += share[0]
+        for children in (tree.children_left, tree.children_right):
+            parents = np.flatnonzero(children >= 0)
+            nodes = children[parents]
+            rows.append(np.repeat(nodes + offset, n_classes))
+            columns.append((tree.feature[parents][:, None] * n_classes + np.arange(n_classes)).ravel())
+            values.append((share[nodes] - share[parents]).ravel() / len(estimators))
+        leaves = np.flatnonzero(tree.children_left < 0)
+        rows.append(np.repeat(leaves + offset, n_classes))
+        columns.append(np.tile(n_features * n_classes + np.arange(n_classes), len(leaves)))
+        values.append(share[leaves].ravel())
+        offset += tree.node_count
+    node_values = sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                                    shape=(offset, (n_features + 1) * n_classes))
+    return node_values, bias / len(estimators)
+
+
+def _accepted_records(validation: ValidationResult) -> list:
+    """
+    Returns the normalized records of a validation, if all records have been accepted.
+    :param validation: result of validating the raw input data
+    :return: list of Talent or Job objects, one per raw record
+    :raises InvalidRecordsError: if a record has been rejected
+    """
+    rejected = [error for error in validation.errors if not error.defaulted]
+    if rejected:
+        raise InvalidRecordsError(rejected)
+    return validation.records
+
+
+def compact_result_dtype(label_dtype: np.dtype, feature_names: list[str] = None) -> np.dtype:
+    """
+    The dtype of the structured arrays returned by Model.predict_bulk_compact.
+    :param label_dtype: dtype of the labels, i.e. of the classes of the classifier
+    :param feature_names: if given, fields for the explanation are added (see explain_features)
+    :return: structured dtype with fields talent_index, job_index, label, score and probability. With feature_names
+        also bias and contributions, the latter with one sub field per feature name
+    """
+    fields = [("talent_index", np.int64), ("job_index", np.int64), ("label", label_dtype), ("score", np.float64),
+              ("probability", np.float64)]
+    if feature_names is not None:
+        fields.append(("bias", np.float64))
+        fields.append(("contributions", [(name, np.float64) for name in feature_names]))
+    return np.dtype(fields)
+
+
+def compact_result(talent_index: np.ndarray, job_index: np.ndarray, labels: np.ndarray, scores: np.ndarray,
+                   probabilities: np.ndarray, bias: np.ndarray = None, contributions: np.ndarray = None,
+                   feature_names: list[str] = None) -> np.ndarray:
+    """
+    Creates the structured array returned by Model.predict_bulk_compact, sorted by score in descending order.
+    :param talent_index: talent index per combination
+    :param job_index: job index per combination
+    :param labels: predicted label per combination
+    :param scores: confidence in the predicted label per combination
+    :param probabilities: calibrated probability of the positive class per combination
+    :param bias: optional bias of the explanation per combination
+    :param contributions: optional contribution per combination and feature
+    :param feature_names: names of the features, required with contributions
+    :return: structured array with fields talent_index, job_index, label, score and probability (plus bias and
+        contributions)
+    """
+    result = np.empty(len(scores), dtype=compact_result_dtype(labels.dtype,
+                                                              feature_names if contributions is not None else None))
+    # stable sort, so that equal scores keep the order of the combinations
+    order = np.argsort(-scores, kind="stable")
+    result["talent_index"] = talent_index[order]
+    result["job_index"] = job_index[order]
+    result["label"] = labels[order]
+    result["score"] = scores[order]
+    result["probability"] = probabilities[order]
+    if contributions is not None:
+        result["bias"] = bias[order]
+        for column, name in enumerate(feature_names):
+            result["contributions"][name] = contributions[order, column]
+    return result
+
+
+def materialize_results(result: np.ndarray, talents_raw: list[dict], jobs_raw: list[dict], rows=None) -> list[dict]:
+    """
+    Turns (selected rows of) a compact result into the dictionaries returned by Model.predict_bulk.
+
+    :param result: structured array as returned by Model.predict_bulk_compact
+    :param talents_raw: list of json-dictionaries the result was predicted for
+    :param jobs_raw: list of json-dictionaries the result was predicted for (or a mapping job_index -> json)
+    :param rows: optional selection of rows (e.g. a slice for the displayed page), if None all rows are materialized
+    :return: list of dictionaries with talent and job (unchanged) along with label, score and probability. If the
+        result contains an explanation, also 'explanation' with 'bias' and 'contributions' (dictionary with value per
+        feature name)
+    """
+    if rows is not None:
+        result = result[rows]
+    explained = "contributions" in result.dtype.names
+    entries = []
+    for entry in np.atleast_1d(result):
+        materialized = {
+            "talent": talents_raw[entry["talent_index"]],
+            "job": jobs_raw[entry["job_index"]],
+            "label": entry["label"],
+            "score": entry["score"],
+            "probability": entry["probability"]
+        }
+        if explained:
+            contributions = entry["contributions"]
+            materialized["explanation"] = {
+                "bias": entry["bias"],
+                "contributions": {name: contributions[name] for name in contributions.dtype.names}
+            }
+        entries.append(materialized)
+    return entries
+
+
 MODEL_FILE_NAME = "matching_model.skops"
+CALIBRATION_FILE_NAME = "matching_model_calibration.npz"
+MANIFEST_FILE_NAME = "training_manifest.json"
+PROCESSED_DATA_FILE_NAME = "data_final.csv"
+INTERIM_DATA_FILE_NAME = "data_internal_representation.csv"
+# data the model is based on, incremental training appends to it (their sizes are kept in the manifest)
+TRAINING_DATA_FILES = [("data_files.interim", INTERIM_DATA_FILE_NAME),
+                       ("data_files.processed", PROCESSED_DATA_FILE_NAME)]
 
 
-def train_and_save_model() -> None:
+def train_and_save_model(incremental: bool = False, drift_threshold: float = 0.05, trees_per_increment: int = 10,
+                         max_estimators: int = 300) -> None:
     """
     Trains and saves a machine learning model based on internally specified data sources.
 
@@ -124,31 +436,304 @@ def train_and_save_model() -> None:
 
     3. Learns model based on these features
 
+    In incremental mode only raw records appended since the last training (tracked by a manifest with the byte offset
+    of the last known record and a fingerprint of the raw data before it) are read and processed, so the cost of
+    parsing and fitting scales with the new records: they are appended to the interim data, their features to the
+    processed data and the forest grows by trees_per_increment trees fitted on them (warm start). Rows appended by an
+    interrupted run are dropped first, using the sizes of interim and processed data kept in the manifest. The grown
+    forest is not calibrated, i.e. its probabilities are vote shares until the next full training. The forest is
+    retrained from the processed data instead, if the accuracy of the current model on the new records dropped by more
+    than drift_threshold compared to the validated accuracy, or if it would grow beyond max_estimators trees. Without a
+    usable manifest, the model is trained from scratch.
+
+    :param incremental: if True, train incrementally if possible
+    :param drift_threshold: maximum tolerated drop in accuracy on new records before retraining
+    :param trees_per_increment: number of trees to add per incremental training
+    :param max_estimators: maximum number of trees before retraining
     :raises OSError: If something went wrong during saving of the model
     """
     print(f"Start model training ...")
     start_time = time.time()
 
-    raw_data = read_and_prepare_raw_data(drop_source=True, write_interim_data=True)
+    manifest = _read_manifest() if incremental else None
+    if manifest is None:
+        if incremental:
+            print("No training manifest found, training from scratch.")
+        _train_from_scratch()
+    else:
+        _train_incrementally(manifest, drift_threshold, trees_per_increment, max_estimators)
+
+    print(f"Finished model training, took ~ {round(time.time() - start_time)} seconds.")
+
 
+def train_and_save_model_out_of_core(chunk_size: int = 100_000, n_estimators: int = 100) -> None:
+    """
+    Trains and saves a machine learning model based on the processed data, without loading it into memory at once.
+
+    The processed data (see train_and_save_model) is memory-mapped and shuffled by a permutation of the row indices.
+    The rows are split into balanced chunks of at most chunk_size rows. Each chunk is fitted with its own small forest
+    (i.e. trees on a subsample of the data), the trees of all chunks are then assembled into one forest. Quality is
+    validated by scoring the forest of each chunk on the next chunk. The calibration is fitted on a sample of each
+    chunk (at most chunk_size rows in total), voted on by the trees of all other chunks (leave-one-chunk-out), so that
+    the held-out vote shares resemble the ones of the assembled forest. Hence, peak memory is bounded by the chunk
+    size rather than the size of the dataset.
+
+    :param chunk_size: maximum number of rows per chunk, each chunk has to contain all labels
+    :param n_estimators: number of trees of the assembled forest (rounded up to a multiple of the number of chunks)
+    :raises OSError: If something went wrong during reading the data or saving of the model
+    :raises ValueError: If a chunk does not contain all labels
+    """
+    print("Start out-of-core model training ...")
+    start_time = time.time()
+    tracemalloc.start()
+    try:
+        matrix, columns = memory_map_data_frame_from_resources("data_files.processed", PROCESSED_DATA_FILE_NAME,
+                                                               chunk_size)
+        label_column = columns.index("label")
+        feature_columns = [column for column in range(len(columns)) if column != label_column]
+        n_rows = matrix.shape[0]
+        n_chunks = max(1, -(-n_rows // chunk_size))
+        trees_per_chunk = -(-n_estimators // n_chunks)
+
+        # shuffle rows by permuting indices instead of the data. Sorting a chunk's indices keeps reads sequential.
+        # Chunks are balanced instead of leaving a small remainder, so that all trees are fitted on similar numbers
+        # of rows
+        permutation = np.random.default_rng().permutation(n_rows)
+        chunks = [np.sort(rows) for rows in np.array_split(permutation, n_chunks)]
+
+        def read_chunk(rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+            chunk = matrix[rows]
+            return chunk[:, feature_columns], chunk[:, label_column].astype(bool)
+
+        estimators = []
+        chunk_estimators = []
+        classes = None
+        scores = []
+        for index, rows in enumerate(chunks):
+            x, y = read_chunk(rows)
+            clf = RandomForestClassifier(n_estimators=trees_per_chunk).fit(x, y)
+            if classes is None:
+                classes = clf.classes_
+            elif not np.array_equal(classes, clf.classes_):
+                raise ValueError(f"Chunk {index} does not contain all labels, please choose a larger chunk size.")
+            if n_chunks > 1:
+                scores.append(clf.score(*read_chunk(chunks[(index + 1) % n_chunks])))
+            chunk_estimators.append(clf.estimators_)
+            estimators.extend(clf.estimators_)
+            print(f"Fitted {trees_per_chunk} trees on chunk {index + 1} of {n_chunks}")
+        if scores:
+            print(f"Model quality based on validation: "
+                  f"{np.mean(scores):.2%} accuracy with a standard deviation of {np.std(scores):.2%}")
+
+        clf = _assemble_forest(estimators, classes, [columns[column] for column in feature_columns])
+        manifest = _read_manifest()
+        if manifest is not None and scores:
+            manifest["accuracy"] = float(np.mean(scores))
+        calibration = None
+        if n_chunks > 1:
+            positive_shares, positive = _held_out_positive_shares(chunks, chunk_estimators, read_chunk,
+                                                                  max(1, chunk_size // n_chunks))
+            calibration = fit_calibration(positive_shares, positive == classes[-1])
+        _save_model(clf, manifest, calibration)
+
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    print(f"Finished out-of-core model training on {n_rows} rows, took ~ {round(time.time() - start_time)} seconds "
+          f"with a peak memory of ~ {peak_memory / 2 ** 20:.1f} MiB (excluding memory-mapped data).")
+
+
+def _held_out_positive_shares(chunks: list[np.ndarray], chunk_estimators: list[list], read_chunk,
+                              samples_per_chunk: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Calculates vote shares of the positive class for a sample of each chunk, voted on only by the trees of the other
+    chunks (leave-one-chunk-out), i.e. by trees which have not been fitted on the sampled rows.
+    :param chunks: sorted row indices per chunk
+    :param chunk_estimators: fitted trees per chunk, all knowing the same classes
+    :param read_chunk: reads features and labels of the given rows
+    :param samples_per_chunk: maximum number of sampled rows per chunk
+    :return: tuple of the held-out vote share of the positive class and the label per sampled row
+    """
+    n_trees = sum(len(trees) for trees in chunk_estimators)
+    positive_shares = []
+    labels = []
+    for index, rows in enumerate(chunks):
+        # every n-th row, i.e. a sample spread over the whole (sorted) chunk
+        x, y = read_chunk(rows[::-(-len(rows) // samples_per_chunk)])
+        # sum of the shares of each tree, exactly as predict_proba of the forest, grouped by chunk
+        votes = np.array([np.sum([tree.predict_proba(x)[:, -1] for tree in trees], axis=0)
+                          for trees in chunk_estimators])
+        positive_shares.append((votes.sum(axis=0) - votes[index]) / (n_trees - len(chunk_estimators[index])))
+        labels.append(y)
+    return np.concatenate(positive_shares), np.concatenate(labels)
+
+
+def _assemble_forest(estimators: list, classes: np.ndarray, feature_names: list[str]) -> RandomForestClassifier:
+    """
+    Assembles fitted decision trees into one random forest, as if it had been fitted as a whole.
+    :param estimators: fitted trees, all knowing the same classes
+    :param classes: the classes known by the trees
+    :param feature_names: names of the features the trees have been fitted on
+    :return: the random forest
+    """
+    clf = RandomForestClassifier(n_estimators=len(estimators))
+    clf.estimators_ = estimators
+    clf.classes_ = classes
+    clf.n_classes_ = len(classes)
+    clf.n_outputs_ = 1
+    clf.n_features_in_ = len(feature_names)
+    clf.feature_names_in_ = np.array(feature_names, dtype=object)
+    return clf
+
+
+def _train_from_scratch() -> None:
+    """
+    Trains and saves a model based on all raw data.
+    :return: None
+    """
+    raw_data = read_raw_data()
+    manifest = _manifest_for(raw_data.shape[0])
+    raw_data = prepare_raw_data(raw_data, drop_source=True)
+    write_data_frame_to_resources(raw_data, "data_files.interim", INTERIM_DATA_FILE_NAME)
+
+    df = _extract_labeled_features(raw_data)
+    write_data_frame_to_resources(df, "data_files.processed", PROCESSED_DATA_FILE_NAME)
+
+    _fit_and_save(df, manifest)
+
+
+def _train_incrementally(manifest: dict, drift_threshold: float, trees_per_increment: int,
+                         max_estimators: int) -> None:
+    """
+    Updates the saved model with the raw records appended since the training described by the manifest.
+    :param manifest: manifest of the last training
+    :param drift_threshold: maximum tolerated drop in accuracy on new records before retraining
+    :param trees_per_increment: number of trees to add
+    :param max_estimators: maximum number of trees before retraining
+    :return: None
+    """
+    if "fingerprint" not in manifest or "data_sizes" not in manifest \
+            or fingerprint_raw_data_before(manifest["offset"]) != manifest["fingerprint"] \
+            or any(resource_size(package_name, file_name) < manifest["data_sizes"].get(file_name, np.inf)
+                   for package_name, file_name in TRAINING_DATA_FILES):
+        print("Raw data or processed data has been changed, not only appended. Training from scratch.")
+        _train_from_scratch()
+        return
+    # rows appended by an interrupted run are not in the manifest yet, they would be appended twice otherwise
+    for package_name, file_name in TRAINING_DATA_FILES:
+        truncate_resource(package_name, file_name, manifest["data_sizes"][file_name])
+
+    # only the records appended after the end of the last known record are read
+    delta = read_raw_data_from(manifest["offset"])
+    if delta.shape[0] == 0:
+        print("No new records since the last training, model is up to date.")
+        return
+    print(f"Training incrementally with {delta.shape[0]} new records")
+    prepared_delta = prepare_raw_data(delta, drop_source=True)
+    df_delta = _extract_labeled_features(prepared_delta)
+    if df_delta["label"].nunique() < len(manifest["classes"]):
+        # new trees have to know all classes, else the forest can't combine their votes
+        print("New records do not contain all labels yet, postponing the incremental training.")
+        return
+    write_data_frame_to_resources(prepared_delta, "data_files.interim", INTERIM_DATA_FILE_NAME, append=True)
+    write_data_frame_to_resources(df_delta, "data_files.processed", PROCESSED_DATA_FILE_NAME, append=True)
+    manifest_new = _manifest_for(manifest["records"] + delta.shape[0])
+
+    model = load_model()
+    clf = model.classifier
+    df_delta_without_label = df_delta.loc[:, df_delta.columns != 'label']
+    accuracy = clf.score(df_delta_without_label, df_delta["label"])
+    print(f"Accuracy of the current model on new records: {accuracy:.2%} (validated: {manifest['accuracy']:.2%})")
+    if manifest["accuracy"] - accuracy > drift_threshold or clf.n_estimators + trees_per_increment > max_estimators:
+        print("Drift threshold or maximum number of trees exceeded, retraining based on all processed data.")
+        _fit_and_save(read_data_frame_from_resources("data_files.processed", PROCESSED_DATA_FILE_NAME), manifest_new)
+        return
+
+    clf.set_params(warm_start=True, n_estimators=clf.n_estimators + trees_per_increment)
+    clf.fit(df_delta_without_label, df_delta["label"])
+    clf.set_params(warm_start=False)
+    # the validated accuracy stays the baseline for detecting drift
+    manifest_new["accuracy"] = manifest["accuracy"]
+    # the calibration was fitted on the vote shares of the previous forest, there are no held-out shares for the
+    # grown one (its old trees have seen most of the processed data), so it is dropped instead of being kept stale
+    if model.calibration is not None:
+        print("Dropped the calibration of the previous forest, probabilities are uncalibrated vote shares until the "
+              "next training from scratch or out-of-core training.")
+    _save_model(clf, manifest_new)
+
+
+def _extract_labeled_features(raw_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Extracts the tabular features for prepared raw data (see prepare_raw_data).
+    :param raw_data: DataFrame with columns talent, job and label
+    :return: DataFrame with one column per feature name and the label
+    """
     # Note: In the next step it would be better to store the state of FeatureExtractor along with the model
     feature_extractor = FeatureExtractorManager()
-    df = pd.DataFrame(list(raw_data.apply(
-        lambda row: feature_extractor.extract_features(talent=row["talent"], job=row["job"]), 1)))
+    features = feature_extractor.extract_features_batch(list(raw_data["talent"]), list(raw_data["job"]),
+                                                        aligned_pairs(raw_data.shape[0]))
+    df = pd.DataFrame(features, columns=feature_extractor.feature_names)
     # reattach label
     df["label"] = raw_data["label"]
-    write_data_frame_to_resources(df, "data_files.processed", "data_final.csv")
+    return df
 
+
+def _fit_and_save(df: pd.DataFrame, manifest: dict) -> None:
+    """
+    Validates and fits a new model on the given features, then saves it along with the manifest.
+    :param df: DataFrame with one column per feature name and the label
+    :param manifest: manifest describing the raw records the features are based on
+    :return: None
+    """
     # shuffle rows. Should not matter, but I always get an icky feeling when seeing sorting by label
     df = df.sample(frac=1)
 
     df_without_label = df.loc[:, df.columns != 'label']
     clf = RandomForestClassifier()
-    scores = cross_val_score(clf, df_without_label, df["label"], cv=10, scoring='accuracy')
+    validation = cross_validate(clf, df_without_label, df["label"], cv=10, scoring='accuracy',
+                                return_estimator=True, return_indices=True)
+    scores = validation["test_score"]
     print(f"Model quality based on validation: "
           f"{scores.mean():.2%} accuracy with a standard deviation of {scores.std():.2%}")
+
+    # out-of-fold vote shares of the positive class, i.e. each row is predicted by the model not fitted on it
+    positive_shares = np.empty(df.shape[0])
+    for estimator, rows in zip(validation["estimator"], validation["indices"]["test"]):
+        positive_shares[rows] = estimator.predict_proba(df_without_label.iloc[rows])[:, -1]
     clf.fit(df_without_label, df["label"])
+    calibration = fit_calibration(positive_shares, df["label"].to_numpy() == clf.classes_[-1])
+
+    manifest["accuracy"] = scores.mean()
+    _save_model(clf, manifest, calibration)
+
+
+def fit_calibration(positive_shares: np.ndarray, positive: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fits an isotonic calibration of the vote share of the positive class, which has to be predicted for rows the
+    model has not been fitted on (e.g. out-of-fold). Isotonic regression predicts by linear interpolation between
+    its thresholds, hence the calibration is stored as these points only (see MysticMeritModel.calibrate).
 
+    :param positive_shares: held-out vote share of the positive class per row
+    :param positive: True for rows of the positive class
+    :return: tuple of increasing vote shares and the calibrated probability at each of them
+    """
+    isotonic = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds="clip")
+    isotonic.fit(positive_shares, positive.astype(np.float64))
+    print(f"Fitted calibration on {len(positive_shares)} held-out predictions "
+          f"with {len(isotonic.X_thresholds_)} points.")
+    return isotonic.X_thresholds_, isotonic.y_thresholds_
+
+
+def _save_model(clf: BaseEstimator, manifest: dict, calibration: tuple[np.ndarray, np.ndarray] = None) -> None:
+    """
+    Saves the model, its calibration and afterwards the manifest of its training.
+    :param clf: the trained classifier
+    :param manifest: manifest describing the training (see _manifest_for), if None no manifest is saved. Sizes of
+        the training data files are added, unless it already has them
+    :param calibration: calibration of the classifier (see fit_calibration), if None a stale one is removed
+    :return: None
+    :raises OSError: If something went wrong during saving
+    """
     model_as_bytes = sio.dumps(clf)
     # Writing into resources is not good style, let's do it here to ease program access
     path = resources.path("model_files", MODEL_FILE_NAME)
@@ -160,7 +745,57 @@ def train_and_save_model() -> None:
         raise
     else:
         print(f"Successfully saved model to {path}.")
-    print(f"Finished model training, took ~ {round(time.time() - start_time)} seconds.")
+
+    path = resources.path("model_files", CALIBRATION_FILE_NAME)
+    try:
+        if calibration is not None:
+            thresholds, probabilities = calibration
+            np.savez(path.as_posix(), thresholds=thresholds, probabilities=probabilities)
+        elif os.path.exists(path.as_posix()):
+            os.remove(path.as_posix())
+    except OSError:
+        print(f"Failed to write calibration to {path}.")
+        raise
+
+    if manifest is None:
+        return
+    manifest["classes"] = clf.classes_.tolist()
+    manifest["n_estimators"] = clf.n_estimators
+    if "data_sizes" not in manifest:
+        # sizes of the training data read for this manifest, anything beyond is dropped by the next incremental run
+        manifest["data_sizes"] = {file_name: resource_size(package_name, file_name)
+                                  for package_name, file_name in TRAINING_DATA_FILES}
+    path = resources.path("model_files", MANIFEST_FILE_NAME)
+    try:
+        with open(path.as_posix(), "w") as file:
+            json.dump(manifest, file, indent=2)
+    except OSError:
+        print(f"Failed to write training manifest to {path}.")
+        raise
+
+
+def _manifest_for(n_records: int) -> dict:
+    """
+    Creates a manifest identifying the raw records read so far, so that only appended records have to be read later.
+    :param n_records: number of raw records read so far
+    :return: dictionary with the number of records, the byte offset right after the last one and a fingerprint of
+        all bytes before this offset (to detect rewritten raw data)
+    """
+    offset = locate_raw_data_end()
+    return {"records": n_records, "offset": offset, "fingerprint": fingerprint_raw_data_before(offset)}
+
+
+def _read_manifest() -> dict:
+    """
+    Reads the manifest of the last training, if there is one.
+    :return: manifest or None, if there is no manifest or model yet
+    """
+    model_path = resources.path("model_files", MODEL_FILE_NAME)
+    path = resources.path("model_files", MANIFEST_FILE_NAME)
+    if not os.path.exists(path.as_posix()) or not os.path.exists(model_path.as_posix()):
+        return None
+    with open(path.as_posix()) as file:
+        return json.load(file)
 
 
 def load_model() -> Model:
@@ -170,10 +805,20 @@ def load_model() -> Model:
     :raises OSError: If loading was not possible
     """
     path = resources.path("model_files", MODEL_FILE_NAME)
+    calibration_path = resources.path("model_files", CALIBRATION_FILE_NAME)
     try:
         with open(path, "rb") as file:
             model_as_bytes = file.read()
-            model = MysticMeritModel(sio.loads(model_as_bytes, trusted=True))
+        version = hashlib.sha256(model_as_bytes)
+        calibration = None
+        if os.path.exists(calibration_path.as_posix()):
+            with np.load(calibration_path.as_posix()) as arrays:
+                calibration = (arrays["thresholds"], arrays["probabilities"])
+            # a new calibration changes the probabilities, hence also the version
+            version.update(calibration[0].tobytes())
+            version.update(calibration[1].tobytes())
+        model = MysticMeritModel(sio.loads(model_as_bytes, trusted=True), version=version.hexdigest(),
+                                 calibration=calibration)
     except OSError:
         print(f"Failed to read the model from {path}. Maybe it has not been trained yet.")
         raise
@@ -0,0 +1,216 @@
+"""
+Provides a memoization cache for predicted scores of (talent, job) combinations.
+"""
+
+import hashlib
+import json
+import time
+
+import numpy as np
+
+# Rough estimate of the memory used per cached entry: five 8-byte arrays (key, label reference, score, last use and
+# expiry), doubled for the copies made while inserting
+BYTES_PER_ENTRY = 80
+
+# Odd 64-bit constant to mix talent and job fingerprints into one key (golden ratio, as in Fibonacci hashing)
+_KEY_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def fingerprint(raw_json: dict) -> int:
+    """
+    Calculate a 64-bit fingerprint of raw json data, independent of the order of keys.
+    :param raw_json: json-dictionary, e.g. representing a talent or job
+    :return: fingerprint as unsigned 64-bit integer
+    """
+    canonical = json.dumps(raw_json, sort_keys=True, separators=(",", ":"), default=str)
+    return int.from_bytes(hashlib.blake2b(canonical.encode(), digest_size=8).digest(), "little")
+
+
+def fingerprints(raw_jsons: list[dict]) -> np.ndarray:
+    """
+    Calculate the fingerprints (see fingerprint) of many json-dictionaries.
+    :param raw_jsons: list of json-dictionaries
+    :return: array of unsigned 64-bit integers
+    """
+    return np.fromiter((fingerprint(raw_json) for raw_json in raw_jsons), dtype=np.uint64, count=len(raw_jsons))
+
+
+def pair_keys(talent_fingerprints: np.ndarray, job_fingerprints: np.ndarray) -> np.ndarray:
+    """
+    Combine talent and job fingerprints element-wise into one cache key per combination.
+    :param talent_fingerprints: fingerprint of the talent per combination
+    :param job_fingerprints: fingerprint of the job per combination
+    :return: array of unsigned 64-bit keys
+    """
+    # uint64 arithmetic wraps around, which is intended here
+    with np.errstate(over="ignore"):
+        return (talent_fingerprints * _KEY_MULTIPLIER) ^ job_fingerprints
+
+
+class ScoreCache:
+    """
+    A class representing a cache with optional time-to-live for the predicted label and score per combination of
+    talent and job.
+
+    Entries are stored in numpy arrays sorted by key, so that a whole grid of combinations is looked up with one
+    vectorized binary search (numpy.searchsorted) instead of a Python pass over the keys. Eviction approximates LRU:
+    the last use is tracked per call of get_many or put_many, not per key, and ties are evicted in arbitrary order.
+
+    The cache is bound to a model version, binding it to another version drops all entries.
+    """
+
+    def __init__(self, max_memory_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = None) -> None:
+        """
+        Initialize an object of ScoreCache.
+
+        :param max_memory_bytes: approximate memory budget, the least recently used entries are evicted beyond it
+        :param ttl_seconds: entries expire after this many seconds, if None they never expire
+        """
+        self.max_entries = max(1, max_memory_bytes // BYTES_PER_ENTRY)
+        self.ttl_seconds = ttl_seconds
+        self.model_version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # counts the calls of get_many and put_many, used as timestamp of the last use
+        self.tick = 0
+        self.clear()
+
+    def bind(self, model_version: str) -> None:
+        """
+        Bind the cache to the given model version, dropping all entries if it differs from the current one.
+        :param model_version: version of the model which predicts the scores to cache
+        :return: None
+        """
+        if model_version != self.model_version:
+            self.clear()
+            self.model_version = model_version
+
+    def clear(self) -> None:
+        """
+        Drop all entries. Metrics are kept.
+        :return: None
+        """
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.labels = np.empty(0, dtype=object)
+        self.scores = np.empty(0, dtype=np.float64)
+        self.last_used = np.empty(0, dtype=np.int64)
+        self.expires_at = np.empty(0, dtype=np.float64)
+
+    def get_many(self, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Look up many combinations at once.
+
+        :param keys: cache key per combination (see pair_keys)
+        :return: tuple of hit mask, label per combination (object array, None on a miss) and score per combination
+            (NaN on a miss)
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        self.tick += 1
+        positions, hit = self._find(keys)
+        positions = positions[hit]
+        if self.ttl_seconds is not None:
+            # expired entries are misses, they are overwritten by put_many or dropped on eviction
+            alive = self.expires_at[positions] > time.monotonic()
+            hit[hit] = alive
+            positions = positions[alive]
+        self.last_used[positions] = self.tick
+
+        labels = np.full(len(keys), None, dtype=object)
+        labels[hit] = self.labels[positions]
+        scores = np.full(len(keys), np.nan)
+        scores[hit] = self.scores[positions]
+        hits = int(hit.sum())
+        self.hits += hits
+        self.misses += len(keys) - hits
+        return hit, labels, scores
+
+    def put_many(self, keys: np.ndarray, labels: np.ndarray, scores: np.ndarray) -> None:
+        """
+        Store the predictions for many combinations at once.
+
+        :param keys: cache key per combination (see pair_keys)
+        :param labels: predicted label per combination
+        :param scores: score per combination
+        :return: None
+        """
+        self.tick += 1
+        expires_at = np.inf if self.ttl_seconds is None else time.monotonic() + self.ttl_seconds
+        # the last prediction wins for keys given more than once, unique also sorts the keys
+        reversed_keys = np.asarray(keys, dtype=np.uint64)[::-1]
+        keys, last = np.unique(reversed_keys, return_index=True)
+        last = len(reversed_keys) - 1 - last
+        labels = np.asarray(labels, dtype=object)[last]
+        scores = np.asarray(scores, dtype=np.float64)[last]
+
+        positions, found = self._find(keys)
+        existing = positions[found]
+        self.labels[existing] = labels[found]
+        self.scores[existing] = scores[found]
+        self.last_used[existing] = self.tick
+        self.expires_at[existing] = expires_at
+
+        new = ~found
+        # inserting sorted keys into the sorted array keeps it sorted
+        insert_at = np.searchsorted(self.keys, keys[new])
+        self.keys = np.insert(self.keys, insert_at, keys[new])
+        self.labels = np.insert(self.labels, insert_at, labels[new])
+        self.scores = np.insert(self.scores, insert_at, scores[new])
+        self.last_used = np.insert(self.last_used, insert_at, self.tick)
+        self.expires_at = np.insert(self.expires_at, insert_at, expires_at)
+        self._evict()
+
+    def _find(self, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Binary search for many keys at once.
+        :param keys: cache key per combination
+        :return: tuple of position in the arrays per key and a mask of the keys found there
+        """
+        if len(self.keys) == 0:
+            return np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return positions, self.keys[positions] == keys
+
+    def _evict(self) -> None:
+        """
+        Drop expired entries and afterwards the least recently used ones beyond max_entries.
+        :return: None
+        """
+        keep = np.ones(len(self.keys), dtype=bool)
+        if self.ttl_seconds is not None:
+            keep &= self.expires_at > time.monotonic()
+        excess = int(keep.sum()) - self.max_entries
+        if excess > 0:
+            # among the entries kept so far, the ones with the oldest last use
+            candidates = np.flatnonzero(keep)
+            keep[candidates[np.argpartition(self.last_used[candidates], excess - 1)[:excess]]] = False
+            self.evictions += excess
+        if not keep.all():
+            self.keys = self.keys[keep]
+            self.labels = self.labels[keep]
+            self.scores = self.scores[keep]
+            self.last_used = self.last_used[keep]
+            self.expires_at = self.expires_at[keep]
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Share of looked up combinations which have been found in the cache.
+        :return: hit rate between 0 and 1, 0 if nothing has been looked up yet
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def metrics(self) -> dict:
+        """
+        Current metrics of the cache.
+        :return: dictionary with hits, misses, hit_rate, evictions, entries and model_version
+        """
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate, "evictions": self.evictions,
+                "entries": len(self.keys), "model_version": self.model_version}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __repr__(self) -> str:
+        return f"ScoreCache({len(self.keys)}/{self.max_entries} entries,hit_rate={self.hit_rate:.2%})"
@@ -1,4 +1,11 @@
+import numpy as np
+
 import models.model_service
+from features.feature_extraction import cross_product_pairs
+from features.job_store import JobStore
+from models.score_cache import ScoreCache
+from models.score_cache import fingerprints
+from models.score_cache import pair_keys
 
 
 class Search:
@@ -6,21 +13,45 @@ class Search:
     Class representing a lightweight search component to search for matches between jobs and talents / candidates.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, cache: ScoreCache = None, job_store_path: str = None) -> None:
         """
         Initialize an object of Search by loading the internally used model.
+
+        :param cache: optional cache for the scores of already seen combinations of talent and job
+        :param job_store_path: optional directory of a store with pre-encoded jobs (see features.job_store), it is
+            loaded into job_store
+        """
+        self.cache = cache
+        self.reload_model()
+        self.job_store = None
+        if job_store_path is not None:
+            self.job_store = JobStore.load(job_store_path, self.model.feature_extractor)
+
+    def reload_model(self) -> None:
+        """
+        (Re)load the internally used model, e.g. after retraining. Cached scores of another model version are dropped.
+        :return: None
         """
         self.model = models.model_service.load_model()
+        if self.cache is not None:
+            self.cache.bind(self.model.version)
 
-    def match(self, talent: dict, job: dict) -> dict:
+    def match(self, talent: dict, job: dict, explain: bool = False) -> dict:
         """
         Calculates the prediction of being a match for a given talent and job.
 
-        The returned score is a representation of the model's confidence in the predicted label.
+        The returned score is a representation of the model's confidence in the predicted label. The returned
+        probability is the calibrated probability of being a match (i.e. of label True), use it to rank matches.
+
+        With explain=True, the dictionary additionally contains an 'explanation' with a 'bias' and the 'contributions'
+        per feature name, which sum up to the score (see MysticMeritModel.explain_features).
+        Explanations are not cached.
 
         :param talent: raw json dictionary representing a talent
         :param job: raw json dictionary representing a job
-        :return: dictionary with unchanged talent and job plus a predicted 'label' along with a 'score'
+        :param explain: if True, add the per-feature contributions to the score
+        :return: dictionary with unchanged talent and job plus a predicted 'label' along with a 'score' and the
+            'probability' of being a match
         """
         # ==> Method description <==
         # This method takes a talent and job as input and uses the machine learning
@@ -34,16 +65,32 @@ class Search:
         #   "score": ...
         # }
         #
-        return self.model.predict(talent, job)
+        # Additionally, the calibrated "probability" of being a match is returned.
+        #
+        if self.cache is not None and not explain:
+            return self.materialize(self._match_bulk_cached([talent], [job]), [talent], [job])[0]
+        return self.model.predict(talent, job, explain)
 
-    def match_bulk(self, talents: list[dict], jobs: list[dict]) -> list[dict]:
+    def match_bulk(self, talents: list[dict], jobs: list[dict], compact: bool = False,
+                   explain: bool = False) -> list[dict] | np.ndarray:
         """
         Calculates the prediction of being a match for all combinations of given talents and jobs.
 
-        The returned score is a representation of the model's confidence in the predicted label.
+        The returned score is a representation of the model's confidence in the predicted label. The returned
+        probability is the calibrated probability of being a match (i.e. of label True), use it to rank matches.
+
+        With compact=True, talents and jobs are not echoed. Instead, a structured array with the fields 'talent_index',
+        'job_index' (position in the given lists), 'label', 'score' and 'probability' is returned, also sorted
+        descending by score.
+        Use materialize to get the dictionaries for the rows actually displayed.
+
+        With explain=True, each result gets an explanation as in match. In the compact form, these are the fields 'bias'
+        and 'contributions', the latter with one sub field per feature name.
 
         :param talents: list of raw json dictionaries each representing a talent
         :param jobs: list of raw json dictionaries each representing a job
+        :param compact: if True, return the compact structured array instead of dictionaries
+        :param explain: if True, add the per-feature contributions to the score
         :return: list of dictionaries each with one unchanged combination plus a predicted 'label' along with a 'score'
         """
         # ==> Method description <==
@@ -68,4 +115,93 @@ class Search:
         #   ...
         # ]
         #
-        return self.model.predict_bulk(talents, jobs)
+        # Additionally, each dictionary contains the calibrated "probability" of being a match.
+        #
+        if self.cache is not None and not explain:
+            result = self._match_bulk_cached(talents, jobs)
+            return result if compact else self.materialize(result, talents, jobs)
+        if compact:
+            return self.model.predict_bulk_compact(talents, jobs, explain)
+        return self.model.predict_bulk(talents, jobs, explain)
+
+    @staticmethod
+    def materialize(result: np.ndarray, talents: list[dict], jobs: list[dict], rows=None) -> list[dict]:
+        """
+        Turns (selected rows of) a compact result of match_bulk into the dictionaries returned by default.
+
+        :param result: structured array as returned by match_bulk with compact=True
+        :param talents: list of raw json dictionaries passed to match_bulk
+        :param jobs: list of raw json dictionaries passed to match_bulk
+        :param rows: optional selection of rows, e.g. slice(0, 10) for the first page. If None, all rows are used.
+        :return: list of dictionaries each with one unchanged combination plus a predicted 'label' along with a 'score'
+        """
+        return models.model_service.materialize_results(result, talents, jobs, rows)
+
+    def match_stored_jobs(self, talents: list[dict], job_ids: list = None, compact: bool = False,
+                          explain: bool = False) -> list[dict] | np.ndarray:
+        """
+        Calculates the prediction of being a match for all combinations of given talents and jobs of the job store.
+
+        Like match_bulk, but job features are taken from the store instead of being computed per request. In the
+        compact form, 'job_index' is the row of the job in the store (see JobStore.ids for its id).
+
+        :param talents: list of raw json dictionaries each representing a talent
+        :param job_ids: ids of the jobs in the store to match with, if None all jobs of the store are used
+        :param compact: if True, return the compact structured array instead of dictionaries
+        :param explain: if True, add the per-feature contributions to the score
+        :return: list of dictionaries each with one unchanged combination plus a predicted 'label' along with a 'score'
+        :raises ValueError: if Search has been initialized without job store
+        """
+        if self.job_store is None:
+            raise ValueError("Search has been initialized without job store.")
+        rows = np.arange(len(self.job_store)) if job_ids is None else self.job_store.rows(job_ids)
+        talent_index, position = cross_product_pairs(len(talents), len(rows))
+        job_index = rows[position]
+        prediction = self.model.predict_pairs_encoded(talents, self.job_store.job_encoding, len(self.job_store),
+                                                      (talent_index, job_index), explain)
+        result = models.model_service.compact_result(
+            talent_index, job_index, *prediction,
+            feature_names=self.model.feature_extractor.feature_names if explain else None)
+        return result if compact else self.materialize_stored_jobs(result, talents)
+
+    def materialize_stored_jobs(self, result: np.ndarray, talents: list[dict], rows=None) -> list[dict]:
+        """
+        Turns (selected rows of) a compact result of match_stored_jobs into the dictionaries returned by default.
+
+        Only the raw jobs of the selected rows are read from the job store.
+
+        :param result: structured array as returned by match_stored_jobs with compact=True
+        :param talents: list of raw json dictionaries passed to match_stored_jobs
+        :param rows: optional selection of rows, e.g. slice(0, 10) for the first page. If None, all rows are used.
+        :return: list of dictionaries each with one unchanged combination plus a predicted 'label' along with a 'score'
+        """
+        if rows is not None:
+            result = np.atleast_1d(result[rows])
+        job_rows = np.unique(result["job_index"])
+        jobs = dict(zip(job_rows.tolist(), self.job_store.raw_jobs(job_rows)))
+        return models.model_service.materialize_results(result, talents, jobs)
+
+    def _match_bulk_cached(self, talents: list[dict], jobs: list[dict]) -> np.ndarray:
+        """
+        Like match_bulk with compact=True, but only combinations missing in the cache are scored by the model.
+
+        :param talents: list of raw json dictionaries each representing a talent
+        :param jobs: list of raw json dictionaries each representing a job
+        :return: structured array as returned by match_bulk with compact=True
+        """
+        talent_index, job_index = cross_product_pairs(len(talents), len(jobs))
+        keys = pair_keys(fingerprints(talents)[talent_index], fingerprints(jobs)[job_index])
+        hit, labels, scores = self.cache.get_many(keys)
+
+        miss = ~hit
+        if miss.any():
+            miss_labels, miss_scores, _ = self.model.predict_pairs(talents, jobs,
+                                                                   (talent_index[miss], job_index[miss]))
+            self.cache.put_many(keys[miss], miss_labels, miss_scores)
+            labels[miss] = miss_labels
+            scores[miss] = miss_scores
+
+        labels = labels.astype(self.model.classifier.classes_.dtype)
+        # calibration is a cheap vectorized lookup, so the probabilities are derived instead of cached
+        probabilities = self.model.calibrate(self.model.positive_shares(labels, scores))
+        return models.model_service.compact_result(talent_index, job_index, labels, scores, probabilities)